@@ -0,0 +1,194 @@
+import re
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PYTHON = sys.executable
+PASSWORD = "bench-password"
+
+
+class Session:
+    # One logged-in client of a virtual user.
+    def __init__(self, client, app):
+        self.client = client
+        self.app = app
+        self.csrf_token = None
+
+
+class ShopApp:
+    # lab1, lab4 and lab5 serve the same shop: users log in, list products and
+    # create them, the admin edits products on the admin panel. The Django
+    # apps add trailing slashes and CSRF protection.
+    def __init__(self, name, path, command, prod_command, setup=(), after_seed=(), bulk_seed=True, django=False, register_name="username"):
+        self.name = name
+        self.path = ROOT / path
+        self.command = command
+        self.prod_command = prod_command
+        self.setup = setup
+        self.after_seed = after_seed
+        self.bulk_seed = bulk_seed
+        self.django = django
+        self.register_name = register_name
+        self.products = 0
+        self.ready_path = self.url("login")
+        self.actions = {
+            "index": (50, self.index),
+            "admin_panel": (10, self.admin_panel),
+            "login": (10, self.login_again),
+            "create_product": (15, self.create_product),
+            "update_product": (15, self.update_product),
+        }
+
+    def url(self, page):
+        return f"/{page}/" if self.django and page else f"/{page}"
+
+    async def post(self, session, page, data):
+        headers = {}
+        if self.django:
+            if session.client.cookies.get("csrftoken") is None:
+                await session.client.get(self.url("login"))
+            headers["X-CSRFToken"] = session.client.cookies.get("csrftoken")
+        return await session.client.post(self.url(page), data=data, headers=headers)
+
+    async def login(self, session, name, password):
+        response = await self.post(session, "login", {"username": name, "password": password})
+        return response.status_code in (302, 303)
+
+    def seeded(self, users, products):
+        self.products = products
+
+    async def seed(self, session, users, products, rng):
+        for i in range(users):
+            data = {self.register_name: f"bench-user-{i}", "password": PASSWORD, "age": rng.randint(18, 80)}
+            await self.post(session, "register", data)
+        session.client.cookies.clear()
+        await self.login(session, "bench-user-0", PASSWORD)
+        for i in range(products):
+            await self.post(session, "create_product", {"name": f"Bench product {i}", "price": rng.randint(1, 5000)})
+        self.products = products
+
+    async def start_worker(self, make_client, worker_id, users):
+        user = Session(make_client(), self)
+        admin = Session(make_client(), self)
+        await self.login(user, f"bench-user-{worker_id % users}", PASSWORD)
+        await self.login(admin, "admin", "admin")
+        return {"user": user, "admin": admin, "name": f"bench-user-{worker_id % users}"}
+
+    async def index(self, state, rng):
+        response = await state["user"].client.get(self.url(""))
+        return response.status_code == 200
+
+    async def admin_panel(self, state, rng):
+        response = await state["admin"].client.get(self.url("admin_panel"))
+        return response.status_code == 200
+
+    async def login_again(self, state, rng):
+        return await self.login(state["user"], state["name"], PASSWORD)
+
+    async def create_product(self, state, rng):
+        data = {"name": f"Bench product {rng.randint(0, 10 ** 9)}", "price": rng.randint(1, 5000)}
+        response = await self.post(state["user"], "create_product", data)
+        return response.status_code in (302, 303)
+
+    async def update_product(self, state, rng):
+        product_id = rng.randint(1, max(self.products, 1))
+        data = {"name": f"Bench product {product_id}", "price": rng.randint(1, 5000)}
+        response = await self.post(state["admin"], f"update_product/{product_id}", data)
+        return response.status_code in (302, 303)
+
+
+class BlogApp:
+    # lab6: users with posts, forms protected by Flask-WTF CSRF tokens.
+    CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+    def __init__(self, name, path, command, prod_command, setup=(), after_seed=(), bulk_seed=True):
+        self.name = name
+        self.path = ROOT / path
+        self.command = command
+        self.prod_command = prod_command
+        self.setup = setup
+        self.after_seed = after_seed
+        self.bulk_seed = bulk_seed
+        self.users = 0
+        self.ready_path = "/"
+        self.actions = {
+            "index": (40, self.index),
+            "posts": (40, self.posts),
+            "add_user": (5, self.add_user),
+            "add_post": (15, self.add_post),
+        }
+
+    async def post(self, session, path, data):
+        if session.csrf_token is None:
+            page = await session.client.get("/add")
+            session.csrf_token = self.CSRF_RE.search(page.text).group(1)
+        return await session.client.post(path, data={"csrf_token": session.csrf_token, **data})
+
+    def seeded(self, users, posts):
+        self.users = users
+
+    async def seed(self, session, users, posts, rng):
+        for i in range(users):
+            await self.post(session, "/add", {"name": f"bench-user-{i}", "age": rng.randint(18, 80)})
+        for i in range(posts):
+            await self.post(session, f"/add_post/{i % users + 1}", {"title": f"Post {i}", "content": "Lorem ipsum " * 20})
+        self.users = users
+
+    async def start_worker(self, make_client, worker_id, users):
+        return {"session": Session(make_client(), self)}
+
+    async def index(self, state, rng):
+        response = await state["session"].client.get("/")
+        return response.status_code == 200
+
+    async def posts(self, state, rng):
+        response = await state["session"].client.get(f"/posts/{rng.randint(1, self.users)}")
+        return response.status_code == 200
+
+    async def add_user(self, state, rng):
+        data = {"name": f"bench-user-{rng.randint(0, 10 ** 9)}", "age": rng.randint(18, 80)}
+        response = await self.post(state["session"], "/add", data)
+        return response.status_code == 302
+
+    async def add_post(self, state, rng):
+        data = {"title": "Bench post", "content": "Lorem ipsum " * 20}
+        response = await self.post(state["session"], f"/add_post/{rng.randint(1, self.users)}", data)
+        return response.status_code == 302
+
+
+# setup, seed.py, after_seed and command(port) run in a scratch copy of the
+# app directory, so every run starts from a fresh database and leaves the
+# repository untouched. lab4 keeps its data in memory and is seeded over HTTP.
+# command is the development server the apps used to run with, prod_command
+# the gunicorn setup their dockerfiles start now.
+
+
+def gunicorn(app):
+    return lambda port: [PYTHON, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", app]
+
+
+APPS = {
+    "lab1": ShopApp(
+        "lab1", "lab1",
+        command=lambda port: [PYTHON, "-m", "uvicorn", "main:app", "--port", str(port)],
+        prod_command=gunicorn("main:app"),
+        after_seed=[[PYTHON, "rebuild_sales.py"]],
+    ),
+    "lab4": ShopApp(
+        "lab4", "lab4/lab4", django=True, bulk_seed=False,
+        command=lambda port: [PYTHON, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"],
+        prod_command=gunicorn("lab4.wsgi"),
+    ),
+    "lab5": ShopApp(
+        "lab5", "lab5/lab5", django=True, register_name="name",
+        command=lambda port: [PYTHON, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"],
+        prod_command=gunicorn("lab5.wsgi"),
+        setup=[[PYTHON, "manage.py", "migrate", "--noinput"]],
+    ),
+    "lab6": BlogApp(
+        "lab6", "lab6",
+        command=lambda port: [PYTHON, "-m", "flask", "--app", "app", "run", "--port", str(port)],
+        prod_command=gunicorn("app:app"),
+        setup=[[PYTHON, "-m", "flask", "--app", "app", "db", "upgrade"]],
+    ),
+}
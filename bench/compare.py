@@ -0,0 +1,45 @@
+import argparse
+import json
+import sys
+
+# Compares two reports of run.py (e.g. the main branch and a feature branch)
+# and exits non-zero when a latency percentile or the throughput regressed by
+# more than the threshold.
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    if baseline["config"] != candidate["config"]:
+        print("warning: the reports were produced with different settings", file=sys.stderr)
+
+    regressions = 0
+    print(f"{'action':<16} {'metric':<15} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    rows = [("total", baseline["total"], candidate["total"])]
+    rows += [(name, stats, candidate["actions"].get(name)) for name, stats in baseline["actions"].items()]
+    for name, before, after in rows:
+        if after is None:
+            continue
+        for metric, higher_is_better in (("throughput_rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False)):
+            if not before[metric] or after[metric] is None:
+                continue
+            change = (after[metric] - before[metric]) / before[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > args.threshold else ""
+            regressions += bool(flag)
+            print(f"{name:<16} {metric:<15} {before[metric]:>10.1f} {after[metric]:>10.1f} {change:>+7.1f}%{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
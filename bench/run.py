@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from apps import APPS, ROOT, Session
+
+IGNORE = shutil.ignore_patterns("__pycache__", "*.db", "db.sqlite3", "instance")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_revision():
+    try:
+        revision = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain"], cwd=ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return revision, dirty
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of an already sorted list.
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def summarize(latencies, errors, seconds):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / seconds,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else None,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+    }
+
+
+class Server:
+    # Runs the app from a scratch copy of its directory.
+    def __init__(self, app, env, seed_args=None, prod=False):
+        self.app = app
+        self.seed_args = seed_args
+        self.command = app.prod_command if prod else app.command
+        self.workdir = Path(tempfile.mkdtemp(prefix=f"bench-{app.name}-"))
+        self.env = {**os.environ, **env}
+        if prod:
+            # Keep the caches the workers share apart from other runs.
+            self.env.setdefault("FRAGMENT_CACHE_PATH", str(self.workdir / "fragments"))
+            self.env.setdefault("DJANGO_CACHE_DIR", str(self.workdir / "cache"))
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = None
+
+    def __enter__(self):
+        shutil.copytree(self.app.path, self.workdir / "app", ignore=IGNORE)
+        cwd = self.workdir / "app"
+        log = open(self.workdir / "server.log", "w")
+        for command in self.app.setup:
+            subprocess.run(command, cwd=cwd, env=self.env, stdout=log, stderr=subprocess.STDOUT, check=True)
+        if self.seed_args is not None:
+            seed = [sys.executable, str(ROOT / "bench" / "seed.py"), self.app.name, "--path", str(cwd), *self.seed_args]
+            for command in [seed, *self.app.after_seed]:
+                subprocess.run(command, cwd=cwd, env=self.env, stdout=log, stderr=subprocess.STDOUT, check=True)
+        self.process = subprocess.Popen(self.command(self.port), cwd=cwd, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        self.wait_ready()
+        return self
+
+    def wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited, see {self.workdir / 'server.log'}")
+            try:
+                if httpx.get(self.url + self.app.ready_path).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"server did not start, see {self.workdir / 'server.log'}")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+async def run_load(app, url, args):
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    timeout = httpx.Timeout(args.timeout)
+    clients = []
+
+    def make_client():
+        client = httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout)
+        clients.append(client)
+        return client
+
+    names = list(app.actions)
+    weights = [app.actions[name][0] for name in names]
+    if args.mix:
+        weights = [args.mix.get(name, 0) for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    measuring = False
+
+    async def worker(worker_id):
+        rng = random.Random(args.seed * 1000 + worker_id)
+        state = await app.start_worker(make_client, worker_id, args.users)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                ok = await app.actions[name][1](state, rng)
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if measuring:
+                if ok:
+                    samples[name].append(elapsed)
+                else:
+                    errors[name] += 1
+
+    try:
+        if args.seed_mode == "http":
+            seeder = Session(make_client(), app)
+            await app.seed(seeder, args.users, args.products, random.Random(args.seed))
+        else:
+            app.seeded(args.users, args.products)
+        deadline = time.perf_counter() + args.warmup + args.duration
+        tasks = [asyncio.create_task(worker(i)) for i in range(args.concurrency)]
+        await asyncio.sleep(args.warmup)
+        measuring = True
+        started = time.perf_counter()
+        await asyncio.gather(*tasks)
+        seconds = time.perf_counter() - started
+    finally:
+        for client in clients:
+            await client.aclose()
+
+    all_latencies = [latency for values in samples.values() for latency in values]
+    return {
+        "total": summarize(all_latencies, sum(errors.values()), seconds),
+        "actions": {name: summarize(samples[name], errors[name], seconds) for name in names if weights[names.index(name)]},
+    }
+
+
+def parse_env(values):
+    env = {}
+    for value in values:
+        key, _, val = value.partition("=")
+        env[key] = val
+    return env
+
+
+def parse_mix(value):
+    if not value:
+        return None
+    return {name: float(weight) for name, weight in (part.split("=") for part in value.split(","))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test one of the apps and report throughput and latency percentiles.")
+    parser.add_argument("app", choices=sorted(APPS))
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--users", type=int, default=20, help="users created before the run")
+    parser.add_argument("--products", type=int, default=200, help="products (lab6: posts) created before the run")
+    parser.add_argument("--orders", type=int, default=0, help="orders created before the run (lab1 only, needs bulk seeding)")
+    parser.add_argument("--seed-mode", choices=["bulk", "http", "none"], default="bulk",
+                        help="bulk: seed.py before the server starts (lab4 and --url fall back to http and none); "
+                             "http: through the app's forms; none: use the data already there")
+    parser.add_argument("--server", choices=["dev", "prod"], default="dev",
+                        help="dev: the development server; prod: gunicorn with the app's gunicorn.conf.py")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds run before measuring")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mix", type=parse_mix, help="action weights, e.g. index=80,admin_panel=20")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to the server, repeatable")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    app = APPS[args.app]
+    env = parse_env(args.env)
+    if args.seed_mode == "bulk" and (args.url or not app.bulk_seed):
+        args.seed_mode = "none" if args.url else "http"
+    if args.url:
+        results = asyncio.run(run_load(app, args.url, args))
+    else:
+        seed_args = None
+        if args.seed_mode == "bulk":
+            seed_args = ["--users", str(args.users), "--products", str(args.products), "--orders", str(args.orders), "--seed", str(args.seed)]
+        with Server(app, env, seed_args, prod=args.server == "prod") as server:
+            results = asyncio.run(run_load(app, server.url, args))
+
+    revision, dirty = git_revision()
+    report = {
+        "app": args.app,
+        "revision": revision,
+        "dirty": dirty,
+        "config": {
+            "users": args.users,
+            "products": args.products,
+            "orders": args.orders,
+            "seed_mode": args.seed_mode,
+            "server": None if args.url else args.server,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "mix": args.mix,
+            "env": env,
+            "url": args.url,
+        },
+        **results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
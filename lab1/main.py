@@ -1,19 +1,30 @@
-from fastapi import FastAPI, Form, Depends, Request, Cookie
-from fastapi.responses import RedirectResponse, HTMLResponse, Response
+import os
+from fastapi import FastAPI, Form, Depends, Request, Cookie, Query
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import ForeignKey, create_engine, Column, Integer, String
+from sqlalchemy import ForeignKey, Column, Integer, String, delete, func, insert, select, text, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
 import uuid
+from markupsafe import Markup
+from typing import List
 from pydantic import BaseModel
+import bulk
+from auth_cache import AuthUser, TokenCache
+from conditional_get import StarletteConditionalGetMiddleware
+from fragment_cache import counter_from_env, fragment_cache_from_env
+from metrics import INSTRUMENTATION_ENABLED, StarletteMetricsMiddleware, instrument_jinja, instrument_sqlalchemy
+from passwords import hash_password, verify_password
 
 app = FastAPI(
     title="Лабораторна робота №1",
 )
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 templates = Jinja2Templates(directory="templates")
@@ -36,32 +47,179 @@ class Product(Base):
 class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True, nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), index=True, nullable=False)
     quantity = Column(Integer, nullable=False)
 
-Base.metadata.create_all(bind=engine)
+class ProductSales(Base):
+    # Order totals per product. place_orders adds every cart to these rollups
+    # in the same transaction as the orders, rebuild_sales.py recomputes them.
+    __tablename__ = "product_sales"
+    product_id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0, index=True)
 
-def get_db():
-    db = SessionLocal()
-    try:
+class UserSales(Base):
+    __tablename__ = "user_sales"
+    user_id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0, index=True)
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+auth_cache = TokenCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60")),
+)
+
+async def get_current_user(auth_token: str = Cookie(None), db: AsyncSession = Depends(get_db)):
+    if auth_token is None:
+        return None
+    auth_cache.sync(users_version.value())
+    user = auth_cache.get(auth_token)
+    if user is None:
+        db_user = await db.scalar(select(User).where(User.token == auth_token))
+        if not db_user:
+            return None
+        user = AuthUser(db_user.id, db_user.name, db_user.role)
+        auth_cache.set(auth_token, user)
+    return user
+
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+MAX_CART_ITEMS = int(os.getenv("MAX_CART_ITEMS", "1000"))
+# The pages whose product list is cached round page_size up to one of these,
+# so a client cannot make a cached fragment for every size up to MAX_PAGE_SIZE.
+PAGE_SIZES = sorted({int(size) for size in os.getenv("PAGE_SIZES", "10,20,50,100,200,500").split(",")} | {PAGE_SIZE})
+
+def cached_page_size(page_size):
+    return next((size for size in PAGE_SIZES if size >= page_size), PAGE_SIZES[-1])
+
+async def keyset_page(db, model, cursor, page_size):
+    # Seek pagination on the primary key: the cursor is the last id of the
+    # previous page, so every page costs an index range scan of page_size rows.
+    query = select(model)
+    if cursor is not None:
+        query = query.where(model.id > cursor)
+    rows = (await db.scalars(query.order_by(model.id).limit(page_size + 1))).all()
+    next_cursor = rows[page_size - 1].id if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+fragment_cache = fragment_cache_from_env("lab1")
+# Bumped on every user change and shared by the workers like the catalog
+# version, so that all of them drop cached tokens and ETags with it.
+users_version = counter_from_env("lab1", "users")
+
+def user_changed(user_id):
+    auth_cache.invalidate_user(user_id)
+    users_version.bump()
+
+async def render_products(db, template_name, cursor, page_size):
+    # The product list only changes when a product is created, updated or
+    # deleted, so one page of it is rendered once per catalog version.
+    async def render():
+        products, next_cursor = await keyset_page(db, Product, cursor, page_size)
+        html = templates.get_template(template_name).render(products=products)
+        return {"html": html, "next_cursor": next_cursor}
+    fragment = await fragment_cache.get_or_render(f"{template_name}:{cursor}:{page_size}", render)
+    return Markup(fragment["html"]), fragment["next_cursor"]
+
+def catalog_validator(request):
+    # read_root depends only on the product catalog, the user and the page.
+    auth_token = request.cookies.get("auth_token")
+    if auth_token is None:
+        return None
+    return (fragment_cache.version(), users_version.value(), auth_token, request.url.query)
+
+app.add_middleware(StarletteConditionalGetMiddleware, validators={"/": catalog_validator})
+
+if INSTRUMENTATION_ENABLED:
+    # Added last so that it is the outermost middleware and also times 304s.
+    instrument_sqlalchemy(engine.sync_engine)
+    instrument_jinja(templates.env)
+    app.add_middleware(StarletteMetricsMiddleware)
+
+SALES_TOP = int(os.getenv("SALES_TOP", "20"))
+
+async def add_sales(db, model, key, totals):
+    # totals: {id: (quantity, revenue)}. One upsert per rollup table; ids are
+    # sorted so concurrent checkouts lock the rows in the same order.
+    upsert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    stmt = upsert(model).values([{key: k, "quantity": q, "revenue": r} for k, (q, r) in sorted(totals.items())])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={"quantity": model.quantity + stmt.excluded.quantity, "revenue": model.revenue + stmt.excluded.revenue},
+    )
+    await db.execute(stmt)
+
+async def record_sales(db, items, prices):
+    by_product, by_user = {}, {}
+    for item in items:
+        revenue = item.quantity * prices[item.product_id]
+        for totals, key in ((by_product, item.product_id), (by_user, item.user_id)):
+            quantity, total = totals.get(key, (0, 0))
+            totals[key] = (quantity + item.quantity, total + revenue)
+    await add_sales(db, ProductSales, "product_id", by_product)
+    await add_sales(db, UserSales, "user_id", by_user)
+
+async def rebuild_sales(db):
+    # Recomputes both rollups from the orders table. Orders do not store the
+    # price they were placed at, so the rebuilt revenue uses current prices.
+    if engine.dialect.name == "postgresql":
+        # Blocks checkouts until the rebuild commits so none are lost or counted twice.
+        await db.execute(text("LOCK TABLE orders IN SHARE MODE"))
+    revenue = func.sum(Order.quantity * Product.price)
+    for model, key in ((ProductSales, Order.product_id), (UserSales, Order.user_id)):
+        await db.execute(delete(model))
+        await db.execute(insert(model).from_select(
+            [key.name, "quantity", "revenue"],
+            select(key, func.sum(Order.quantity), revenue).join(Product, Product.id == Order.product_id).group_by(key),
+        ))
+    await db.commit()
+
+async def top_sales(db):
+    # Reads only the rollups, so the cost does not grow with the number of orders.
+    top_products = (await db.execute(
+        select(Product.name, ProductSales.quantity, ProductSales.revenue)
+        .join(Product, Product.id == ProductSales.product_id)
+        .order_by(ProductSales.revenue.desc()).limit(SALES_TOP)
+    )).all()
+    top_users = (await db.execute(
+        select(User.name, UserSales.quantity, UserSales.revenue)
+        .join(User, User.id == UserSales.user_id)
+        .order_by(UserSales.revenue.desc()).limit(SALES_TOP)
+    )).all()
+    totals = (await db.execute(select(func.sum(ProductSales.quantity), func.sum(ProductSales.revenue)))).one()
+    return {"products": top_products, "users": top_users, "quantity": totals[0] or 0, "revenue": totals[1] or 0}
 
 def generate_token():
     return str(uuid.uuid4())
 
-def create_default_admin(db: Session):
-    admin_user = db.query(User).filter(User.name == "admin").first()
+async def create_default_admin(db: AsyncSession):
+    admin_user = await db.scalar(select(User).where(User.name == "admin"))
     if not admin_user:
         admin_token = generate_token()
-        new_admin = User(name="admin", password="admin", age=30, token=admin_token, role="admin")
+        new_admin = User(name="admin", password=await hash_password("admin"), age=30, token=admin_token, role="admin")
         db.add(new_admin)
-        db.commit()
+        await db.commit()
 
-with SessionLocal() as db:
-    create_default_admin(db)
+@app.on_event("startup")
+async def startup_event():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # create_all skips existing tables, so indexes added to them later
+        # are created here.
+        await conn.run_sync(lambda sync_conn: [
+            index.create(sync_conn, checkfirst=True) for table in Base.metadata.sorted_tables for index in table.indexes
+        ])
+    async with SessionLocal() as db:
+        await create_default_admin(db)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await engine.dispose()
 
 class UserSchema(BaseModel):
     name: str
@@ -103,32 +261,29 @@ class OrderSchema(BaseModel):
         }
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request, auth_token: str = Cookie(None), db: Session = Depends(get_db)):
-    if auth_token is None:
-        return RedirectResponse("/login")
-    user = db.query(User).filter(User.token == auth_token).first()
+async def read_root(request: Request, cursor: int = Query(None), page_size: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), user: AuthUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    page_size = cached_page_size(page_size)
     if not user:
         return RedirectResponse("/login")
     if user.role == "admin":
         return RedirectResponse("/admin_panel")
-    products = db.query(Product).all()
-    return templates.TemplateResponse("index.html", {"request": request, "user": user, "products": products})
+    products_html, next_cursor = await render_products(db, "products_list.html", cursor, page_size)
+    return templates.TemplateResponse("index.html", {"request": request, "user": user, "products_html": products_html, "next_cursor": next_cursor})
 
 @app.get("/create_product", response_class=HTMLResponse)
-async def create_product_form(request: Request, auth_token: str = Cookie(None), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.token == auth_token).first()
+async def create_product_form(request: Request, user: AuthUser = Depends(get_current_user)):
     if not user or user.role != "user":
         return RedirectResponse("/login")
     return templates.TemplateResponse("create_product.html", {"request": request})
 
 @app.post("/create_product", response_class=HTMLResponse, summary="Create a new product", description="Allows the user to create a new product by providing a name and price.")
-async def create_product(request: Request, name: str = Form(...), price: int = Form(...), auth_token: str = Cookie(None), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.token == auth_token).first()
+async def create_product(request: Request, name: str = Form(...), price: int = Form(...), user: AuthUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if not user or user.role != "user":
         return RedirectResponse("/login")
     new_product = Product(name=name, price=price)
     db.add(new_product)
-    db.commit()
+    await db.commit()
+    fragment_cache.bump()
     return RedirectResponse("/", status_code=302)
 
 @app.get("/login", response_class=HTMLResponse)
@@ -136,9 +291,14 @@ async def login_form(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 @app.post("/login", response_class=HTMLResponse, summary="User login", description="Allows users to log in and get a session token.")
-async def login(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.name == username).first()
-    if user and user.password == password:
+async def login(request: Request, username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.name == username))
+    valid, new_hash = await verify_password(password, user.password) if user else (False, None)
+    if valid:
+        if new_hash:
+            user.password = new_hash
+            await db.commit()
+        auth_cache.set(user.token, AuthUser(user.id, user.name, user.role))
         response = RedirectResponse("/admin_panel" if user.role == "admin" else "/", status_code=302)
         response.set_cookie(key="auth_token", value=user.token, httponly=True, max_age=3600, path='/', samesite='Lax')
         return response
@@ -149,74 +309,246 @@ async def register_form(request: Request):
     return templates.TemplateResponse("register.html", {"request": request})
 
 @app.post("/register", response_class=HTMLResponse, summary="User registration", description="Allows new users to register.")
-async def register(request: Request, username: str = Form(...), password: str = Form(...), age: int = Form(...), db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.name == username).first()
+async def register(request: Request, username: str = Form(...), password: str = Form(...), age: int = Form(...), db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(select(User).where(User.name == username))
     if existing_user:
         return templates.TemplateResponse("register.html", {"request": request, "error": "User already exists"})
     token = generate_token()
-    new_user = User(name=username, password=password, age=age, token=token, role="user")
+    new_user = User(name=username, password=await hash_password(password), age=age, token=token, role="user")
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    auth_cache.set(new_user.token, AuthUser(new_user.id, new_user.name, new_user.role))
     response = RedirectResponse("/", status_code=302)
     response.set_cookie(key="auth_token", value=new_user.token, httponly=True, max_age=3600, path='/', samesite='Lax')
     return response
 
+# Messages the admin panel shows after a refused change, by ?error= code.
+ADMIN_ERRORS = {
+    "user_has_orders": "The user has orders and cannot be deleted.",
+    "product_has_orders": "The product has been ordered and cannot be deleted.",
+}
+
+async def has_orders(db, column, value):
+    # Orders keep the user and product they reference: deleting either would
+    # leave orphans on SQLite, which does not enforce foreign keys, and fail
+    # on PostgreSQL.
+    return await db.scalar(select(Order.id).where(column == value).limit(1)) is not None
+
+async def delete_unless_ordered(db, obj, column):
+    # False if obj has orders. The IntegrityError covers an order placed
+    # after the check where foreign keys are enforced.
+    if await has_orders(db, column, obj.id):
+        return False
+    await db.delete(obj)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return False
+    return True
+
 @app.get("/admin_panel", response_class=HTMLResponse)
-async def admin_panel(request: Request, auth_token: str = Cookie(None), db: Session = Depends(get_db)):
-    if auth_token is None:
-        return RedirectResponse("/login")
-    user = db.query(User).filter(User.token == auth_token).first()
-    if not user:
-        return RedirectResponse("/login")
-    if user.role != "admin":
+async def admin_panel(request: Request, users_cursor: int = Query(None), products_cursor: int = Query(None), page_size: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), error: str = Query(None), user: AuthUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    page_size = cached_page_size(page_size)
+    if not user or user.role != "admin":
         return RedirectResponse("/login")
-    users = db.query(User).all()
-    products = db.query(Product).all()
-    return templates.TemplateResponse("admin_panel.html", {"request": request, "users": users, "products": products})
+    users, next_users_cursor = await keyset_page(db, User, users_cursor, page_size)
+    products_html, next_products_cursor = await render_products(db, "admin_products_list.html", products_cursor, page_size)
+    sales = await top_sales(db)
+    return templates.TemplateResponse("admin_panel.html", {"request": request, "users": users, "products_html": products_html, "next_users_cursor": next_users_cursor, "next_products_cursor": next_products_cursor, "sales": sales, "error": ADMIN_ERRORS.get(error)})
 
 @app.post("/delete_user/{user_id}", response_class=HTMLResponse, summary="Delete a user", description="Allows admin to delete users.")
-async def delete_user(user_id: int, db: Session = Depends(get_db), auth_token: str = Cookie(None)):
-    user = db.query(User).filter(User.token == auth_token).first()
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db), user: AuthUser = Depends(get_current_user)):
     if not user or user.role != "admin":
         return RedirectResponse("/login")
-    user_to_delete = db.query(User).filter(User.id == user_id).first()
+    user_to_delete = await db.get(User, user_id)
     if user_to_delete:
-        db.delete(user_to_delete)
-        db.commit()
+        if not await delete_unless_ordered(db, user_to_delete, Order.user_id):
+            return RedirectResponse("/admin_panel?error=user_has_orders", status_code=302)
+        user_changed(user_id)
     return RedirectResponse("/admin_panel", status_code=302)
 
 @app.post("/update_user/{user_id}", response_class=HTMLResponse, summary="Update user details", description="Allows admin to update user details.")
-async def update_user(user_id: int, username: str = Form(...), age: int = Form(...), db: Session = Depends(get_db), auth_token: str = Cookie(None)):
-    admin = db.query(User).filter(User.token == auth_token, User.role == "admin").first()
-    if not admin:
+async def update_user(user_id: int, username: str = Form(...), age: int = Form(...), db: AsyncSession = Depends(get_db), admin: AuthUser = Depends(get_current_user)):
+    if not admin or admin.role != "admin":
         return RedirectResponse("/login")
-    user_to_update = db.query(User).filter(User.id == user_id).first()
+    user_to_update = await db.get(User, user_id)
     if user_to_update:
         user_to_update.name = username
         user_to_update.age = age
-        db.commit()
+        await db.commit()
+        user_changed(user_id)
     return RedirectResponse("/admin_panel", status_code=303)
 
 @app.post("/delete_product/{product_id}", response_class=HTMLResponse, summary="Delete a product", description="Allows admin to delete products.")
-async def delete_product(product_id: int, db: Session = Depends(get_db), auth_token: str = Cookie(None)):
-    admin = db.query(User).filter(User.token == auth_token, User.role == "admin").first()
-    if not admin:
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_db), admin: AuthUser = Depends(get_current_user)):
+    if not admin or admin.role != "admin":
         return RedirectResponse("/login")
-    product_to_delete = db.query(Product).filter(Product.id == product_id).first()
+    product_to_delete = await db.get(Product, product_id)
     if product_to_delete:
-        db.delete(product_to_delete)
-        db.commit()
+        if not await delete_unless_ordered(db, product_to_delete, Order.product_id):
+            return RedirectResponse("/admin_panel?error=product_has_orders", status_code=302)
+        fragment_cache.bump()
     return RedirectResponse("/admin_panel", status_code=302)
 
 @app.post("/update_product/{product_id}", response_class=HTMLResponse, summary="Update product details", description="Allows admin to update product details.")
-async def update_product(product_id: int, name: str = Form(...), price: int = Form(...), db: Session = Depends(get_db), auth_token: str = Cookie(None)):
-    admin = db.query(User).filter(User.token == auth_token, User.role == "admin").first()
-    if not admin:
+async def update_product(product_id: int, name: str = Form(...), price: int = Form(...), db: AsyncSession = Depends(get_db), admin: AuthUser = Depends(get_current_user)):
+    if not admin or admin.role != "admin":
         return RedirectResponse("/login")
-    product_to_update = db.query(Product).filter(Product.id == product_id).first()
+    product_to_update = await db.get(Product, product_id)
     if product_to_update:
         product_to_update.name = name
         product_to_update.price = price
-        db.commit()
+        await db.commit()
+        fragment_cache.bump()
     return RedirectResponse("/admin_panel", status_code=303)
+
+PRODUCT_FIELDS = {"name": bulk.text(), "price": bulk.whole_number}
+USER_FIELDS = {"name": bulk.text(), "age": bulk.whole_number}
+# Users and products with orders are not deleted, see has_orders.
+ORDER_COLUMNS = {User: Order.user_id, Product: Order.product_id}
+
+async def apply_chunk(db, model, chunk, report):
+    # One IN query checks the ids, then one (executemany) statement per kind of
+    # change. Returns the ids of the rows that changed.
+    ids = [op.id for op in chunk if op.op != "create"]
+    existing = set(await db.scalars(select(model.id).where(model.id.in_(ids)))) if ids else set()
+    creates, updates, deletes = [], [], []
+    for op in chunk:
+        if op.op != "create" and op.id not in existing:
+            report[op.index] = bulk.result(op.index, op.op, op.id, "error", "not found")
+        else:
+            {"create": creates, "update": updates, "delete": deletes}[op.op].append(op)
+    if creates:
+        stmt = insert(model).returning(model.id, sort_by_parameter_order=engine.dialect.name != "sqlite")
+        new_ids = await db.scalars(stmt, [op.values for op in creates])
+        if engine.dialect.name == "sqlite":
+            # SQLite numbers the rows of a write transaction in insertion
+            # order, and ordered RETURNING would insert them one at a time.
+            new_ids = sorted(new_ids)
+        for op, new_id in zip(creates, new_ids):
+            op.id = new_id
+            report[op.index] = bulk.result(op.index, op.op, new_id, bulk.DONE[op.op])
+    if updates:
+        await db.execute(update(model), [{"id": op.id, **op.values} for op in updates])
+        for op in updates:
+            report[op.index] = bulk.result(op.index, op.op, op.id, bulk.DONE[op.op])
+    if deletes:
+        column = ORDER_COLUMNS[model]
+        ordered = set(await db.scalars(select(column).where(column.in_([op.id for op in deletes])).distinct()))
+        for op in deletes:
+            if op.id in ordered:
+                report[op.index] = bulk.result(op.index, op.op, op.id, "error", "has orders")
+        deletes = [op for op in deletes if op.id not in ordered]
+        await db.execute(delete(model).where(model.id.in_([op.id for op in deletes])))
+        for op in deletes:
+            report[op.index] = bulk.result(op.index, op.op, op.id, bulk.DONE[op.op])
+    return [op.id for op in creates + updates + deletes]
+
+async def apply_bulk(request, db, model, fields, ops):
+    rows = bulk.parse_payload(await request.body(), request.headers.get("content-type", ""))
+    valid, report = bulk.validate(rows, fields, ops)
+    changed = []
+    for chunk in bulk.chunks(valid):
+        try:
+            chunk_changed = await apply_chunk(db, model, chunk, report)
+            await db.commit()
+        except SQLAlchemyError:
+            # A constraint broke the chunk: retry its rows one transaction
+            # each so that only the offending rows fail.
+            await db.rollback()
+            chunk_changed = []
+            for op in chunk:
+                try:
+                    chunk_changed += await apply_chunk(db, model, [op], report)
+                    await db.commit()
+                except SQLAlchemyError as e:
+                    await db.rollback()
+                    report[op.index] = bulk.result(op.index, op.op, None if op.op == "create" else op.id, "error", str(getattr(e, "orig", e)))
+        changed += chunk_changed
+    return report, changed
+
+@app.post("/bulk/products", summary="Bulk product changes", description="Creates, updates and deletes products from a JSON list or a CSV file in chunked transactions and reports the result of every row.")
+async def bulk_products(request: Request, db: AsyncSession = Depends(get_db), admin: AuthUser = Depends(get_current_user)):
+    if not admin or admin.role != "admin":
+        return RedirectResponse("/login")
+    try:
+        report, changed = await apply_bulk(request, db, Product, PRODUCT_FIELDS, ("create", "update", "delete"))
+    except bulk.PayloadError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
+    if changed:
+        fragment_cache.bump()
+    return bulk.summary(report)
+
+@app.post("/bulk/users", summary="Bulk user changes", description="Updates and deletes users from a JSON list or a CSV file in chunked transactions and reports the result of every row.")
+async def bulk_users(request: Request, db: AsyncSession = Depends(get_db), admin: AuthUser = Depends(get_current_user)):
+    if not admin or admin.role != "admin":
+        return RedirectResponse("/login")
+    try:
+        report, changed = await apply_bulk(request, db, User, USER_FIELDS, ("update", "delete"))
+    except bulk.PayloadError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
+    for user_id in changed:
+        auth_cache.invalidate_user(user_id)
+    if changed:
+        users_version.bump()
+    return bulk.summary(report)
+
+@app.post("/orders", summary="Place orders", description="Places every item of a cart in one transaction. Regular users can only order for themselves.")
+async def place_orders(items: List[OrderSchema], user: AuthUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if not user:
+        return RedirectResponse("/login")
+    if not items or len(items) > MAX_CART_ITEMS:
+        return JSONResponse({"detail": f"A cart must have between 1 and {MAX_CART_ITEMS} items"}, status_code=400)
+    if any(item.quantity < 1 for item in items):
+        return JSONResponse({"detail": "Quantity must be positive"}, status_code=400)
+    if user.role != "admin" and any(item.user_id != user.id for item in items):
+        return JSONResponse({"detail": "Orders can only be placed for the current user"}, status_code=403)
+
+    # One IN query per referenced table validates the whole cart, and the rows
+    # go in with a single executemany insert inside one transaction.
+    product_ids = {item.product_id for item in items}
+    prices = dict((await db.execute(select(Product.id, Product.price).where(Product.id.in_(product_ids)))).all())
+    if prices.keys() != product_ids:
+        return JSONResponse({"detail": "Unknown products", "product_ids": sorted(product_ids - prices.keys())}, status_code=400)
+    user_ids = {item.user_id for item in items}
+    if user_ids != {user.id}:
+        found = set(await db.scalars(select(User.id).where(User.id.in_(user_ids))))
+        if found != user_ids:
+            return JSONResponse({"detail": "Unknown users", "user_ids": sorted(user_ids - found)}, status_code=400)
+
+    await db.execute(insert(Order), [item.model_dump() for item in items])
+    await record_sales(db, items, prices)
+    await db.commit()
+    return JSONResponse({"created": len(items)}, status_code=201)
+
+@app.get("/orders", summary="Order history", description="Orders of the current user with their products, in the order they were placed.")
+async def order_history(cursor: int = Query(None), page_size: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), user: AuthUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if not user:
+        return RedirectResponse("/login")
+    query = (
+        select(Order.id, Order.product_id, Order.quantity, Product.name, Product.price)
+        .join(Product, Product.id == Order.product_id)
+        .where(Order.user_id == user.id)
+    )
+    if cursor is not None:
+        query = query.where(Order.id > cursor)
+    rows = (await db.execute(query.order_by(Order.id).limit(page_size + 1))).all()
+    next_cursor = rows[page_size - 1].id if len(rows) > page_size else None
+    orders = [
+        {"id": row.id, "product_id": row.product_id, "product_name": row.name, "price": row.price, "quantity": row.quantity, "total": row.price * row.quantity}
+        for row in rows[:page_size]
+    ]
+    return {"orders": orders, "next_cursor": next_cursor}
+
+@app.get("/auth_cache_stats", summary="Auth cache statistics", description="Hit/miss counters of the auth token cache.")
+async def auth_cache_stats(user: AuthUser = Depends(get_current_user)):
+    if not user or user.role != "admin":
+        return RedirectResponse("/login")
+    return auth_cache.stats()
+
+@app.get("/fragment_cache_stats", summary="Fragment cache statistics", description="Hits, misses and render time saved by the product list cache.")
+async def fragment_cache_stats(user: AuthUser = Depends(get_current_user)):
+    if not user or user.role != "admin":
+        return RedirectResponse("/login")
+    return fragment_cache.stats()
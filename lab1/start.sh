@@ -0,0 +1,6 @@
+#!/bin/sh
+# SERVER_MODE=development runs the development server instead.
+if [ "$SERVER_MODE" = "development" ]; then
+    exec uvicorn main:app --host 0.0.0.0 --port 8000 --reload
+fi
+exec gunicorn -c gunicorn.conf.py main:app
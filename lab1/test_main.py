@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+
+# A throwaway SQLite file unless TEST_DATABASE_URL points elsewhere; the
+# tables are dropped after every test.
+workdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL', f'sqlite+aiosqlite:///{workdir}/test.db')
+os.environ.setdefault('PASSWORD_ROUNDS', '1000')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from main import Base, Order, Product, SessionLocal, User, app, engine, fragment_cache
+
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        self.client.__enter__()
+        # The cached product pages outlive the dropped tables.
+        fragment_cache.bump()
+
+    def tearDown(self):
+        self.client.portal.call(self.drop_tables)
+        self.client.__exit__(None, None, None)
+
+    async def drop_tables(self):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+
+    def rows(self, query):
+        async def run():
+            async with SessionLocal() as db:
+                return (await db.execute(query)).all()
+        return self.client.portal.call(run)
+
+    def login(self, name, password):
+        response = self.client.post('/login', data={'username': name, 'password': password}, follow_redirects=False)
+        self.assertEqual(response.status_code, 302)
+
+    def register(self, name):
+        self.client.post('/register', data={'username': name, 'password': 'secret', 'age': 20}, follow_redirects=False)
+        return self.rows(select(User.id).where(User.name == name))[0].id
+
+    def create_products(self, *prices):
+        self.login('admin', 'admin')
+        report = self.client.post('/bulk/products', json=[{'op': 'create', 'name': f'P{price}', 'price': price} for price in prices]).json()
+        return [entry['id'] for entry in report['results']]
+
+
+class BulkTest(MainTest):
+    def test_products(self):
+        self.login('admin', 'admin')
+        report = self.client.post('/bulk/products', json=[
+            {'op': 'create', 'name': 'Tea', 'price': 3},
+            {'op': 'create', 'name': 'Cake', 'price': 'cheap'},
+            {'op': 'create', 'name': 'Bun', 'price': 1},
+        ]).json()
+        self.assertEqual([entry['status'] for entry in report['results']], ['created', 'error', 'created'])
+        tea, bun = report['results'][0]['id'], report['results'][2]['id']
+
+        report = self.client.post('/bulk/products', json=[
+            {'op': 'update', 'id': tea, 'price': 4},
+            {'op': 'update', 'id': bun, 'name': 'Sweet bun'},
+            {'op': 'delete', 'id': 999999},
+        ]).json()
+        self.assertEqual((report['updated'], report['failed']), (2, 1))
+        self.assertEqual(report['results'][2]['error'], 'not found')
+        self.assertEqual(self.rows(select(Product.name, Product.price).order_by(Product.id)), [('Tea', 4), ('Sweet bun', 1)])
+
+        report = self.client.post('/bulk/products', content='op,id,name,price\r\ndelete,%d,,\r\n' % bun, headers={'Content-Type': 'text/csv'}).json()
+        self.assertEqual(report['deleted'], 1)
+        self.assertEqual(self.rows(select(Product.name)), [('Tea',)])
+
+    def test_users(self):
+        ann, bob = self.register('ann'), self.register('bob')
+        self.login('admin', 'admin')
+        report = self.client.post('/bulk/users', json=[
+            {'op': 'update', 'id': ann, 'name': 'anna', 'age': 21},
+            {'op': 'delete', 'id': bob},
+            {'op': 'create', 'name': 'cid', 'age': 30},
+        ]).json()
+        self.assertEqual([entry['status'] for entry in report['results']], ['updated', 'deleted', 'error'])
+        self.assertEqual(self.rows(select(User.name, User.age).where(User.role == 'user')), [('anna', 21)])
+
+    def test_bad_payloads(self):
+        self.login('admin', 'admin')
+        response = self.client.post('/bulk/products', content='not json', headers={'Content-Type': 'application/json'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/bulk/products', json=[]).json(), {'detail': 'no rows'})
+
+    def test_requires_admin(self):
+        self.register('ann')
+        response = self.client.post('/bulk/products', json=[{'op': 'create', 'name': 'Tea', 'price': 3}], follow_redirects=False)
+        self.assertEqual(response.status_code, 307)
+        self.assertEqual(self.rows(select(Product.id)), [])
+
+
+class OrdersTest(MainTest):
+    def test_place_and_list_orders(self):
+        tea, bun = self.create_products(3, 1)
+        ann = self.register('ann')
+        response = self.client.post('/orders', json=[
+            {'user_id': ann, 'product_id': tea, 'quantity': 2},
+            {'user_id': ann, 'product_id': bun, 'quantity': 5},
+        ])
+        self.assertEqual(response.status_code, 201)
+        orders = self.client.get('/orders').json()['orders']
+        self.assertEqual([(order['product_id'], order['quantity'], order['total']) for order in orders], [(tea, 2, 6), (bun, 5, 5)])
+
+    def test_rejects_bad_carts(self):
+        tea, = self.create_products(3)
+        ann = self.register('ann')
+        self.assertEqual(self.client.post('/orders', json=[{'user_id': ann, 'product_id': 999, 'quantity': 1}]).status_code, 400)
+        self.assertEqual(self.client.post('/orders', json=[{'user_id': ann, 'product_id': tea, 'quantity': 0}]).status_code, 400)
+        self.assertEqual(self.client.post('/orders', json=[{'user_id': ann + 1, 'product_id': tea, 'quantity': 1}]).status_code, 403)
+        self.assertEqual(self.client.post('/orders', json=[]).status_code, 400)
+        self.assertEqual(self.rows(select(Order.id)), [])
+
+    def test_ordered_users_and_products_are_kept(self):
+        tea, bun = self.create_products(3, 1)
+        ann = self.register('ann')
+        self.client.post('/orders', json=[{'user_id': ann, 'product_id': tea, 'quantity': 1}])
+        self.login('admin', 'admin')
+
+        response = self.client.post(f'/delete_product/{tea}', follow_redirects=False)
+        self.assertEqual(response.headers['location'], '/admin_panel?error=product_has_orders')
+        self.assertIn('has been ordered', self.client.get(response.headers['location']).text)
+        response = self.client.post(f'/delete_user/{ann}', follow_redirects=False)
+        self.assertEqual(response.headers['location'], '/admin_panel?error=user_has_orders')
+
+        report = self.client.post('/bulk/products', json=[{'op': 'delete', 'id': tea}, {'op': 'delete', 'id': bun}]).json()
+        self.assertEqual([entry.get('error') for entry in report['results']], ['has orders', None])
+        report = self.client.post('/bulk/users', json=[{'op': 'delete', 'id': ann}]).json()
+        self.assertEqual(report['results'][0]['error'], 'has orders')
+        self.assertEqual(self.rows(select(Product.id)), [(tea,)])
+        self.assertEqual(len(self.rows(select(User.id).where(User.id == ann))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+AuthUser = namedtuple("AuthUser", ["id", "name", "role"])
+
+
+class TokenCache:
+    # Bounded token -> AuthUser map. Entries expire after `ttl` seconds and the
+    # least recently used one is evicted once `maxsize` is reached.
+    # invalidate_user only reaches the cache of the process that handled the
+    # write; other workers see the change through sync().
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._synced_version = None
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def set(self, token, user):
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (user, time.monotonic() + self.ttl)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def sync(self, version):
+        # version: a users version shared by all workers, bumped on every
+        # user change. Any change since the last call drops every entry.
+        if version != self._synced_version:
+            with self._lock:
+                if version != self._synced_version:
+                    self._entries.clear()
+                    self._tokens_by_user.clear()
+                    self._synced_version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, token):
+        user, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user.id]
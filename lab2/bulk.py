@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+import os
+
+# Bulk admin changes. A payload is a JSON list of objects or a CSV file with a
+# header row (Content-Type: text/csv). Every row has an "op" (create, update or
+# delete), an "id" for updates and deletes and the fields to set; empty CSV
+# cells are left out. Valid rows are applied BULK_CHUNK_SIZE at a time, one
+# transaction per chunk, and every row gets an entry in the report, in
+# payload order.
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "100000"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+# Report status of a row that was applied, by op.
+DONE = {"create": "created", "update": "updated", "delete": "deleted"}
+
+
+class PayloadError(ValueError):
+    pass
+
+
+class Op:
+    def __init__(self, index, op, id, values):
+        self.index = index
+        self.op = op
+        self.id = id
+        self.values = values
+
+
+def text(max_length=None):
+    def convert(value):
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError("must be a non-empty string")
+        value = value.strip()
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f"must be at most {max_length} characters")
+        return value
+    return convert
+
+
+def whole_number(value):
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    raise ValueError("must be a whole number")
+
+
+def parse_payload(body, content_type):
+    if len(body) > BULK_MAX_BYTES:
+        raise PayloadError(f"at most {BULK_MAX_BYTES} bytes per request")
+    if content_type.split(";")[0].strip() == "text/csv":
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            rows = [{key: value for key, value in row.items() if key and value not in (None, "")} for row in reader]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise PayloadError(f"invalid CSV: {e}")
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError as e:
+            raise PayloadError(f"invalid JSON: {e}")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise PayloadError("expected a JSON list of objects")
+    if not rows:
+        raise PayloadError("no rows")
+    if len(rows) > BULK_MAX_ROWS:
+        raise PayloadError(f"at most {BULK_MAX_ROWS} rows per request")
+    return rows
+
+
+def validate(rows, fields, ops=("create", "update", "delete"), parse_id=whole_number):
+    # fields: {name: converter}. Creates need every field, updates at least
+    # one. An id may appear only once, so the order rows are applied in
+    # within a chunk does not matter. Returns the valid rows as Ops and the
+    # report with the invalid rows already filled in.
+    valid = []
+    report = [None] * len(rows)
+    seen = set()
+    for index, row in enumerate(rows):
+        op = row.get("op")
+        row_id = row.get("id")
+        try:
+            if op not in ops:
+                raise ValueError(f"op must be one of {', '.join(ops)}")
+            if op != "create":
+                if row_id is None:
+                    raise ValueError("id is required")
+                try:
+                    row_id = parse_id(row_id)
+                except ValueError:
+                    raise ValueError(f"invalid id {row_id!r}")
+                if row_id in seen:
+                    raise ValueError("id appears more than once")
+                seen.add(row_id)
+            values = {}
+            if op != "delete":
+                unknown = set(row) - set(fields) - {"op", "id"}
+                if unknown:
+                    raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+                for name, convert in fields.items():
+                    if name in row:
+                        try:
+                            values[name] = convert(row[name])
+                        except (TypeError, ValueError) as e:
+                            raise ValueError(f"{name} {e}")
+                    elif op == "create":
+                        raise ValueError(f"{name} is required")
+                if not values:
+                    raise ValueError("nothing to update")
+        except ValueError as e:
+            report[index] = result(index, op, row_id, "error", str(e))
+            continue
+        valid.append(Op(index, op, None if op == "create" else row_id, values))
+    return valid, report
+
+
+def chunks(ops, size=None):
+    size = size or BULK_CHUNK_SIZE
+    for start in range(0, len(ops), size):
+        yield ops[start:start + size]
+
+
+def result(index, op, id, status, error=None):
+    entry = {"row": index + 1, "op": op, "id": id if id is None or isinstance(id, int) else str(id), "status": status}
+    if error is not None:
+        entry["error"] = error
+    return entry
+
+
+def summary(report):
+    counts = {"created": 0, "updated": 0, "deleted": 0, "error": 0}
+    for entry in report:
+        counts[entry["status"]] += 1
+    return {
+        "created": counts["created"],
+        "updated": counts["updated"],
+        "deleted": counts["deleted"],
+        "failed": counts["error"],
+        "results": report,
+    }
@@ -0,0 +1,68 @@
+import hashlib
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Conditional GET for pages whose content is fully determined by a few cheap
+# values (a catalog version, the user, the query string). A validator maps a
+# request to those values; when the client's If-None-Match matches the ETag
+# built from them, a 304 is returned before the view queries or renders
+# anything.
+
+
+def make_etag(parts):
+    digest = hashlib.sha1("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison.
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def validator_headers(etag):
+    # The pages are per user, so caches must revalidate and key on the cookie.
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Cookie"}
+
+
+class StarletteConditionalGetMiddleware:
+    # validators: {path: callable(request) -> tuple of parts or None}.
+    # None means "not cacheable", e.g. an anonymous request that redirects.
+    def __init__(self, app, validators):
+        self.app = app
+        self.validators = validators
+
+    async def __call__(self, scope, receive, send):
+        validator = self.validators.get(scope.get("path")) if scope["type"] == "http" else None
+        if validator is None or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        parts = validator(request)
+        if parts is None:
+            await self.app(scope, receive, send)
+            return
+
+        etag = make_etag(parts)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            await Response(status_code=304, headers=validator_headers(etag))(scope, receive, send)
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(scope=message)
+                for name, value in validator_headers(etag).items():
+                    if name == "Vary":
+                        headers.add_vary_header(value)
+                    else:
+                        headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class LocalCounter:
+    # A version number for one worker process.
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def value(self):
+        return self._value
+
+    def bump(self):
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+class FileCounter:
+    # A version number in a file that every worker on the host sees. Bumps
+    # are serialised with flock. A missing file (e.g. tmpfs emptied by a
+    # reboot) restarts from the clock, so no earlier ETag can match again.
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def value(self):
+        try:
+            with open(self.path) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def bump(self):
+        import fcntl
+
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                value = self.value() + 1 if os.path.exists(self.path) else time.time_ns()
+                write_atomic(self.path, str(value))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return value
+
+
+class LRUBackend:
+    # In-process storage. Each worker process has its own copy and its own
+    # catalog version, so use SharedMemoryBackend when running several workers.
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def version(self):
+        return self._version
+
+    def bump(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            return self._version
+
+    def get(self, version, key):
+        with self._lock:
+            value = self._entries.get((version, key))
+            if value is not None:
+                self._entries.move_to_end((version, key))
+            return value
+
+    def set(self, version, key, value):
+        with self._lock:
+            self._entries[(version, key)] = value
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class SharedMemoryBackend:
+    # Stores the version counter and the fragments as files in a tmpfs
+    # directory (/dev/shm by default), which every worker on the host sees.
+    # Files are replaced atomically. At most maxsize fragments are kept; the
+    # oldest ones are removed first.
+    def __init__(self, path, maxsize=256):
+        self.path = path
+        self.maxsize = maxsize
+        os.makedirs(path, exist_ok=True)
+        self._version = FileCounter(os.path.join(path, "version"))
+
+    def version(self):
+        return self._version.value()
+
+    def bump(self):
+        version = self._version.bump()
+        self._sweep(version)
+        return version
+
+    def get(self, version, key):
+        try:
+            with open(self._entry_path(version, key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set(self, version, key, value):
+        path = self._entry_path(version, key)
+        write_atomic(path, json.dumps(value))
+        # A bump that ran while the fragment was being rendered may have swept
+        # the directory before this file existed; nothing would remove it.
+        current = self.version()
+        if current != version:
+            self._remove(path)
+        self._sweep(current)
+
+    def _entry_path(self, version, key):
+        return os.path.join(self.path, f"{version}-{hashlib.sha1(key.encode()).hexdigest()}.json")
+
+    def _sweep(self, version):
+        # Removes the fragments of every other version and, past maxsize,
+        # the oldest fragments of this one.
+        prefix = f"{version}-"
+        current = []
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith(".json"):
+                continue
+            if not entry.name.startswith(prefix):
+                self._remove(entry.path)
+                continue
+            try:
+                current.append((entry.stat().st_mtime_ns, entry.path))
+            except FileNotFoundError:
+                pass
+        if len(current) > self.maxsize:
+            current.sort()
+            for _, path in current[:len(current) - self.maxsize]:
+                self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class FragmentCache:
+    # Rendered HTML fragments keyed by the catalog version. Every product
+    # mutation calls bump(), after which all earlier fragments are stale.
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.render_seconds = 0.0
+        self.render_seconds_saved = 0.0
+
+    def version(self):
+        return self.backend.version()
+
+    def bump(self):
+        return self.backend.bump()
+
+    async def get_or_render(self, key, render):
+        # render() returns a JSON-serialisable dict; its run time is stored
+        # with the fragment and counted as saved on every later hit.
+        version = self.backend.version()
+        value = self.backend.get(version, key)
+        if value is not None:
+            self.hits += 1
+            self.render_seconds_saved += value["render_seconds"]
+            return value
+        self.misses += 1
+        started = time.perf_counter()
+        value = await render()
+        value["render_seconds"] = time.perf_counter() - started
+        self.render_seconds += value["render_seconds"]
+        self.backend.set(version, key, value)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "version": self.version(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "render_seconds": self.render_seconds,
+            "render_seconds_saved": self.render_seconds_saved,
+        }
+
+
+def fragment_cache_path(name):
+    return os.getenv("FRAGMENT_CACHE_PATH", f"/dev/shm/{name}-fragments")
+
+
+def fragment_cache_from_env(name):
+    maxsize = int(os.getenv("FRAGMENT_CACHE_SIZE", "256"))
+    if os.getenv("FRAGMENT_CACHE", "lru") == "shm":
+        return FragmentCache(SharedMemoryBackend(fragment_cache_path(name), maxsize))
+    return FragmentCache(LRUBackend(maxsize))
+
+
+def counter_from_env(name, counter):
+    # Another version number (e.g. of the users), shared between the workers
+    # whenever the fragment cache is: a file next to the fragments.
+    if os.getenv("FRAGMENT_CACHE", "lru") == "shm":
+        return FileCounter(os.path.join(fragment_cache_path(name), f"{counter}-version"))
+    return LocalCounter()
@@ -0,0 +1,205 @@
+import contextvars
+import os
+import threading
+import time
+
+from jinja2 import Template
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+
+# Request instrumentation: latency per route, the number and time of database
+# statements and the template render time of every request. Everything is off
+# unless METRICS=1 (collect and serve /metrics in the Prometheus text format)
+# or SERVER_TIMING=1 (send a Server-Timing header) is set; when both are off
+# the apps do not install any hook, so there is nothing to pay per request.
+# Counters live in the worker process, so with several workers each scrape
+# sees the worker that answered it.
+METRICS_ENABLED = os.getenv("METRICS", "0") == "1"
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "0") == "1"
+INSTRUMENTATION_ENABLED = METRICS_ENABLED or SERVER_TIMING_ENABLED
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        return (
+            f'app;dur={self.elapsed() * 1000:.1f}, '
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_count} queries", '
+            f'tpl;dur={self.template_seconds * 1000:.1f}'
+        )
+
+
+# The timings of the request being handled. Hooks that run outside a request
+# (startup, CLI commands) see None and record nothing.
+current = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_db(seconds):
+    timings = current.get()
+    if timings is not None:
+        timings.db_count += 1
+        timings.db_seconds += seconds
+
+
+def record_template(seconds):
+    timings = current.get()
+    if timings is not None:
+        timings.template_seconds += seconds
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def labels(**values):
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in values.items()) + "}"
+
+
+class Registry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.requests = {}
+        self.latency = {}
+        self.db_statements = {}
+        self.db_seconds = {}
+        self.template_seconds = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, timings):
+        seconds = timings.elapsed()
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            counts = self.latency.setdefault((route, method), [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += seconds
+            self.db_statements[route] = self.db_statements.get(route, 0) + timings.db_count
+            self.db_seconds[route] = self.db_seconds.get(route, 0.0) + timings.db_seconds
+            self.template_seconds[route] = self.template_seconds.get(route, 0.0) + timings.template_seconds
+
+    def render(self):
+        with self._lock:
+            lines = [
+                "# HELP http_requests_total Requests handled, by route, method and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{labels(route=route, method=method, status=status)} {count}")
+            lines += [
+                "# HELP http_request_duration_seconds Request latency.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (route, method), counts in sorted(self.latency.items()):
+                for bound, count in zip([*self.buckets, "+Inf"], counts[:-1]):
+                    lines.append(f"http_request_duration_seconds_bucket{labels(route=route, method=method, le=bound)} {count}")
+                lines.append(f"http_request_duration_seconds_sum{labels(route=route, method=method)} {counts[-1]}")
+                lines.append(f"http_request_duration_seconds_count{labels(route=route, method=method)} {counts[-2]}")
+            for name, help_text, values in (
+                ("db_statements_total", "Database statements executed.", self.db_statements),
+                ("db_duration_seconds_total", "Time spent executing database statements.", self.db_seconds),
+                ("template_render_seconds_total", "Time spent rendering templates.", self.template_seconds),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for route, value in sorted(values.items()):
+                    lines.append(f"{name}{labels(route=route)} {value}")
+            return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def instrument_sqlalchemy(target):
+    # target is the sync_engine of the AsyncEngine.
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_started = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        record_db(time.perf_counter() - context.metrics_started)
+
+    event.listen(target, "before_cursor_execute", before)
+    event.listen(target, "after_cursor_execute", after)
+
+
+def instrument_jinja(env):
+    # Must run before the first template is loaded. Template time includes
+    # anything the template pulls lazily, e.g. a cursor it iterates over.
+    class TimedTemplate(Template):
+        def render(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return super().render(*args, **kwargs)
+            finally:
+                record_template(time.perf_counter() - started)
+
+        async def render_async(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await super().render_async(*args, **kwargs)
+            finally:
+                record_template(time.perf_counter() - started)
+
+        async def generate_async(self, *args, **kwargs):
+            # Streamed templates finish after the response headers are sent,
+            # so only /metrics sees their full render time.
+            chunks = super().generate_async(*args, **kwargs)
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    record_template(time.perf_counter() - started)
+                yield chunk
+
+    env.template_class = TimedTemplate
+
+
+class StarletteMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if METRICS_ENABLED and scope["path"] == METRICS_PATH:
+            await Response(registry.render(), media_type=CONTENT_TYPE)(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    MutableHeaders(scope=message).append("Server-Timing", timings.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current.reset(token)
+            if METRICS_ENABLED:
+                route = getattr(scope.get("route"), "path", "unmatched")
+                registry.observe(route, scope["method"], status, timings)
@@ -0,0 +1,70 @@
+import bisect
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Upper bounds (seconds) of the checkout wait histogram buckets.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class PoolMetrics:
+    # Time spent in pool.connect(): waiting for a free connection, opening an
+    # overflow connection and the pre-ping. Shared by every pool instance,
+    # since the engine replaces its pool on dispose().
+    def __init__(self, buckets=WAIT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, timed_out=False):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def histogram(self):
+        # Cumulative counts per upper bound, like a Prometheus histogram.
+        with self._lock:
+            total = 0
+            result = {}
+            for bound, count in zip([*self.buckets, "+Inf"], self.counts):
+                total += count
+                result[str(bound)] = total
+            return result
+
+    def stats(self, pool):
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds,
+            "wait_seconds_max": self.max_wait_seconds,
+            "wait_seconds_histogram": self.histogram(),
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            pool_metrics.observe(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.observe(time.perf_counter() - started)
+        return connection
@@ -0,0 +1,17 @@
+import asyncio
+from main import Base, SessionLocal, engine, rebuild_sales
+
+# Recomputes the product_sales and user_sales rollups from the orders table.
+# Meant to run periodically (e.g. from cron) to correct any drift.
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        await rebuild_sales(db)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
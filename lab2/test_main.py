@@ -0,0 +1,18 @@
+import importlib.util
+import os
+import unittest
+
+# main.py here is generated from lab1's, so lab1's tests run unchanged
+# against it: their `import main` finds this directory's main.py first.
+# Set TEST_DATABASE_URL to run them against Postgres.
+path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'lab1', 'test_main.py')
+spec = importlib.util.spec_from_file_location('lab1_test_main', path)
+lab1_tests = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(lab1_tests)
+
+BulkTest = lab1_tests.BulkTest
+OrdersTest = lab1_tests.OrdersTest
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# Production server: gunicorn managing uvicorn workers, which run on uvloop
+# with the httptools parser. One worker per CPU by default; WEB_CONCURRENCY
+# overrides it. Send SIGHUP for a graceful restart: new workers are started
+# and the old ones finish their requests first.
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+# No preload: the Motor client is created when main is imported and a
+# MongoClient must not be carried over a fork, so every worker imports the
+# app itself.
+preload_app = False
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then, at different times, so leaks cannot pile up.
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+# The fragment cache has to be shared, otherwise a worker that did not see a
+# write keeps serving the old product list.
+os.environ.setdefault("FRAGMENT_CACHE", "shm")
+
+INIT = """
+import asyncio
+import main
+
+asyncio.run(main.startup_event())
+main.fragment_cache.bump()
+"""
+
+
+def on_starting(server):
+    # Create the collections, indexes and the admin once, in a separate
+    # process, so that the workers' startup events find them and do not race
+    # each other. The cache version is bumped past whatever an earlier run
+    # left in shared memory.
+    subprocess.run([sys.executable, "-c", INIT], check=True)
@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import hmac
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+# Cost is a per-deployment setting. Raising PASSWORD_ROUNDS makes existing
+# hashes "need update", and they are rehashed on the user's next login.
+PASSWORD_ROUNDS = int(os.getenv("PASSWORD_ROUNDS", "290000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+
+def make_context(rounds):
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        pbkdf2_sha256__default_rounds=rounds,
+        pbkdf2_sha256__min_rounds=rounds,
+    )
+
+
+context = make_context(PASSWORD_ROUNDS)
+
+# PBKDF2 runs inside hashlib with the GIL released, so a thread pool gives real
+# parallelism while keeping the KDF off the event loop. The pool size bounds
+# how many hashes run at once; further logins queue behind them.
+executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+def verify_and_update(password, stored, context=context):
+    # Returns (valid, new_hash). new_hash is set when the stored value should
+    # be replaced: it was hashed with an outdated cost or is legacy plaintext.
+    if context.identify(stored, required=False) is None:
+        if hmac.compare_digest(password.encode(), stored.encode()):
+            return True, context.hash(password)
+        return False, None
+    return context.verify_and_update(password, stored)
+
+
+async def hash_password(password):
+    return await asyncio.get_running_loop().run_in_executor(executor, context.hash, password)
+
+
+async def verify_password(password, stored):
+    return await asyncio.get_running_loop().run_in_executor(executor, verify_and_update, password, stored)
+
+
+def benchmark(rounds_list, seconds):
+    print(f"{'rounds':>10} {'ms/login':>10} {'logins/sec/core':>16}")
+    for rounds in rounds_list:
+        bench_context = make_context(rounds)
+        stored = bench_context.hash("benchmark-password")
+        count = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            verify_and_update("benchmark-password", stored, bench_context)
+            count += 1
+        elapsed = time.perf_counter() - started
+        print(f"{rounds:>10} {elapsed / count * 1000:>10.1f} {count / elapsed:>16.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure password verification throughput per cost setting.")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[100000, PASSWORD_ROUNDS, 600000])
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent on each setting")
+    args = parser.parse_args()
+    benchmark(args.rounds, args.seconds)
@@ -0,0 +1,246 @@
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+import time
+from pymongo import ASCENDING, DESCENDING, DeleteOne, IndexModel, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+INDEXES = {
+    "users": [
+        IndexModel([("token", ASCENDING)], unique=True, name="token_unique"),
+        IndexModel([("name", ASCENDING)], unique=True, name="name_unique"),
+        # find_admin_by_token filters on both fields.
+        IndexModel([("token", ASCENDING), ("role", ASCENDING)], name="token_role"),
+    ],
+    "orders": [
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        # OrderRepository.history pages through one user's orders by _id.
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_id_id"),
+        IndexModel([("product_id", ASCENDING)], name="product_id"),
+    ],
+    # SalesRepository.top reads the best sellers by revenue.
+    "product_sales": [IndexModel([("revenue", DESCENDING)], name="revenue")],
+    "user_sales": [IndexModel([("revenue", DESCENDING)], name="revenue")],
+}
+
+
+async def ensure_indexes(db):
+    for name, indexes in INDEXES.items():
+        try:
+            await db[name].create_indexes(indexes)
+        except OperationFailure as e:
+            # Usually duplicate names or tokens left over from before the
+            # unique indexes existed; the app still works, just unindexed.
+            print(f"could not create indexes on {name}: {e}")
+
+
+def parse_cursor(cursor):
+    if cursor is None:
+        return None
+    if ObjectId.is_valid(cursor):
+        return ObjectId(cursor)
+    if is_int_id(cursor):
+        return int(cursor)
+    return None
+
+
+def is_int_id(value):
+    # BSON integers are at most 8 bytes.
+    return value.isdigit() and int(value) < 2 ** 63
+
+
+def parse_id(value):
+    # migrate.py copies documents with their integer primary keys, everything
+    # created through the app gets an ObjectId. An ObjectId can be all digits,
+    # so it is checked first, as in parse_cursor.
+    if isinstance(value, (int, ObjectId)):
+        return value
+    if ObjectId.is_valid(value):
+        return ObjectId(value)
+    if is_int_id(value):
+        return int(value)
+    raise InvalidId(f"{value!r} is not a valid id")
+
+
+def keyset_filter(cursor):
+    if cursor is None:
+        return {}
+    if isinstance(cursor, int):
+        # Integer ids sort before ObjectIds, so the page after an integer id
+        # continues into the ObjectId range.
+        return {"$or": [{"_id": {"$gt": cursor}}, {"_id": {"$type": "objectId"}}]}
+    return {"_id": {"$gt": cursor}}
+
+
+class Page:
+    # Async iterable over one keyset page. Documents are streamed straight from
+    # the Motor cursor into the template; next_cursor is known once the loop
+    # has finished, which is exactly when the template renders the page links.
+    def __init__(self, cursor, page_size):
+        self._cursor = cursor
+        self.page_size = page_size
+        self.next_cursor = None
+
+    async def __aiter__(self):
+        count = 0
+        last_id = None
+        async for doc in self._cursor:
+            count += 1
+            if count > self.page_size:
+                self.next_cursor = str(last_id)
+                break
+            last_id = doc["_id"]
+            yield doc
+
+
+class Repository:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, doc_id):
+        return await self.collection.find_one({"_id": parse_id(doc_id)})
+
+    async def create(self, doc):
+        result = await self.collection.insert_one(doc)
+        return result.inserted_id
+
+    async def update(self, doc_id, fields):
+        await self.collection.update_one({"_id": parse_id(doc_id)}, {"$set": fields})
+
+    async def delete(self, doc_id):
+        await self.collection.delete_one({"_id": parse_id(doc_id)})
+
+    async def existing_ids(self, ids):
+        # One $in query covered by the _id index, however many ids are given.
+        cursor = self.collection.find({"_id": {"$in": list(ids)}}, {"_id": 1})
+        return {doc["_id"] async for doc in cursor}
+
+    async def bulk_apply(self, ops):
+        # Creates, updates and deletes (bulk.Op, creates get an ObjectId here)
+        # sent as one unordered bulk_write, so a failing document does not stop
+        # the others. Returns {position in ops: error message}.
+        requests = []
+        for op in ops:
+            if op.op == "create":
+                op.id = ObjectId()
+                requests.append(InsertOne({"_id": op.id, **op.values}))
+            elif op.op == "update":
+                requests.append(UpdateOne({"_id": op.id}, {"$set": op.values}))
+            else:
+                requests.append(DeleteOne({"_id": op.id}))
+        try:
+            await self.collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            return {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+        return {}
+
+    def page(self, cursor, page_size):
+        query = self.collection.find(keyset_filter(parse_cursor(cursor))).sort("_id", 1).limit(page_size + 1)
+        return Page(query, page_size)
+
+
+class UserRepository(Repository):
+    async def find_by_token(self, token):
+        if token is None:
+            return None
+        return await self.collection.find_one({"token": token})
+
+    async def find_admin_by_token(self, token):
+        if token is None:
+            return None
+        return await self.collection.find_one({"token": token, "role": "admin"})
+
+    async def find_by_name(self, name):
+        return await self.collection.find_one({"name": name})
+
+    async def find_admin(self):
+        return await self.collection.find_one({"role": "admin"})
+
+
+class ProductRepository(Repository):
+    async def prices(self, ids):
+        # {_id: price} for the given ids that exist, fetched with one $in query.
+        cursor = self.collection.find({"_id": {"$in": list(ids)}}, {"price": 1})
+        return {doc["_id"]: doc["price"] async for doc in cursor}
+
+
+class OrderRepository(Repository):
+    async def create_many(self, docs):
+        # A single insert_many command instead of one round-trip per document.
+        result = await self.collection.insert_many(docs, ordered=True)
+        return result.inserted_ids
+
+    async def ordered(self, field, ids):
+        # The ids among the given ones that some order references by field
+        # ("user_id" or "product_id"), answered from that field's index.
+        return set(await self.collection.distinct(field, {field: {"$in": list(ids)}}))
+
+    async def history(self, user_id, cursor, page_size):
+        # Orders joined with their products by one aggregation, $lookup runs
+        # against the products _id index for each order in the page only.
+        pipeline = [
+            {"$match": {"user_id": user_id, **keyset_filter(parse_cursor(cursor))}},
+            {"$sort": {"_id": 1}},
+            {"$limit": page_size + 1},
+            {"$lookup": {"from": "products", "localField": "product_id", "foreignField": "_id", "as": "product"}},
+            {"$unwind": "$product"},
+        ]
+        docs = await self.collection.aggregate(pipeline).to_list(None)
+        next_cursor = str(docs[page_size - 1]["_id"]) if len(docs) > page_size else None
+        return docs[:page_size], next_cursor
+
+
+class SalesRepository:
+    # Order totals per product and per user, keyed by the product or user _id.
+    # record() adds each cart with $inc upserts; rebuild() recomputes both
+    # collections from the orders with $merge pipelines.
+    def __init__(self, db):
+        self.db = db
+
+    async def record(self, orders, prices):
+        by_product, by_user = {}, {}
+        for order in orders:
+            revenue = order["quantity"] * prices[order["product_id"]]
+            for totals, key in ((by_product, order["product_id"]), (by_user, order["user_id"])):
+                quantity, total = totals.get(key, (0, 0))
+                totals[key] = (quantity + order["quantity"], total + revenue)
+        for name, totals in (("product_sales", by_product), ("user_sales", by_user)):
+            requests = [
+                UpdateOne({"_id": key}, {"$inc": {"quantity": quantity, "revenue": revenue}}, upsert=True)
+                for key, (quantity, revenue) in totals.items()
+            ]
+            await self.db[name].bulk_write(requests, ordered=False)
+
+    async def rebuild(self):
+        # Orders do not store the price they were placed at, so the rebuilt
+        # revenue uses current prices. Documents are replaced in place and the
+        # ones not produced by this run are removed afterwards, so readers
+        # never see an empty collection.
+        rebuilt_at = time.time()
+        for name, key in (("product_sales", "$product_id"), ("user_sales", "$user_id")):
+            await self.db["orders"].aggregate([
+                {"$lookup": {"from": "products", "localField": "product_id", "foreignField": "_id", "as": "product"}},
+                {"$unwind": "$product"},
+                {"$group": {
+                    "_id": key,
+                    "quantity": {"$sum": "$quantity"},
+                    "revenue": {"$sum": {"$multiply": ["$quantity", "$product.price"]}},
+                }},
+                {"$set": {"rebuilt_at": rebuilt_at}},
+                {"$merge": {"into": name, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+            ]).to_list(None)
+            await self.db[name].delete_many({"rebuilt_at": {"$ne": rebuilt_at}})
+
+    async def top(self, name, join, limit):
+        return await self.db[name].aggregate([
+            {"$sort": {"revenue": -1}},
+            {"$limit": limit},
+            {"$lookup": {"from": join, "localField": "_id", "foreignField": "_id", "as": "doc"}},
+            {"$unwind": "$doc"},
+            {"$project": {"name": "$doc.name", "quantity": 1, "revenue": 1}},
+        ]).to_list(None)
+
+    async def totals(self):
+        result = await self.db["product_sales"].aggregate([
+            {"$group": {"_id": None, "quantity": {"$sum": "$quantity"}, "revenue": {"$sum": "$revenue"}}},
+        ]).to_list(None)
+        return result[0] if result else {"quantity": 0, "revenue": 0}
@@ -0,0 +1,76 @@
+import os
+import unittest
+
+os.environ.setdefault('PASSWORD_ROUNDS', '1000')
+
+# An in-memory mongomock database unless TEST_MONGO_URL points at a server;
+# the collections are dropped after every test.
+if os.getenv('TEST_MONGO_URL'):
+    os.environ['MONGO_URL'] = os.environ['TEST_MONGO_URL']
+else:
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+    motor.motor_asyncio.AsyncIOMotorClient = lambda *args, **kwargs: AsyncMongoMockClient()
+
+from fastapi.testclient import TestClient
+
+from main import app, db, fragment_cache
+
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        self.client.__enter__()
+        # The cached product pages outlive the dropped collections.
+        fragment_cache.bump()
+
+    def tearDown(self):
+        self.client.portal.call(self.drop_collections)
+        self.client.__exit__(None, None, None)
+
+    async def drop_collections(self):
+        for name in await db.list_collection_names():
+            await db.drop_collection(name)
+
+    def find_id(self, collection, **query):
+        return str(self.client.portal.call(db[collection].find_one, query)['_id'])
+
+    def count(self, collection):
+        return self.client.portal.call(db[collection].count_documents, {})
+
+    def login(self, name, password):
+        response = self.client.post('/login', data={'username': name, 'password': password}, follow_redirects=False)
+        self.assertEqual(response.status_code, 302)
+
+    def register(self, name):
+        self.client.post('/register', data={'username': name, 'password': 'secret', 'age': 20}, follow_redirects=False)
+        return self.find_id('users', name=name)
+
+
+class OrdersTest(MainTest):
+    def test_ordered_users_and_products_are_kept(self):
+        ann = self.register('ann')
+        self.login('admin', 'admin')
+        report = self.client.post('/bulk/products', json=[
+            {'op': 'create', 'name': 'Tea', 'price': 3},
+            {'op': 'create', 'name': 'Bun', 'price': 1},
+        ]).json()
+        tea, bun = report['results'][0]['id'], report['results'][1]['id']
+        response = self.client.post('/orders', json=[{'user_id': ann, 'product_id': tea, 'quantity': 2}])
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.post(f'/delete_user/{ann}', follow_redirects=False)
+        self.assertEqual(response.headers['location'], '/admin_panel?error=user_has_orders')
+        response = self.client.post(f'/delete_product/{tea}', follow_redirects=False)
+        self.assertEqual(response.headers['location'], '/admin_panel?error=product_has_orders')
+        self.assertIn('The product has been ordered', self.client.get(response.headers['location']).text)
+
+        report = self.client.post('/bulk/products', json=[{'op': 'delete', 'id': tea}, {'op': 'delete', 'id': bun}]).json()
+        self.assertEqual([(entry['status'], entry.get('error')) for entry in report['results']], [('error', 'has orders'), ('deleted', None)])
+        report = self.client.post('/bulk/users', json=[{'op': 'delete', 'id': ann}]).json()
+        self.assertEqual(report['results'][0]['error'], 'has orders')
+        self.assertEqual((self.count('users'), self.count('products'), self.count('orders')), (2, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,15 @@
+import multiprocessing
+import os
+
+# Production server: gunicorn with threaded workers. The users and products
+# live in the memory of the process, so there is exactly one worker process and
+# the concurrency comes from its threads (2 * CPUs + 1 by default, THREADS
+# overrides it). Send SIGHUP for a graceful restart; note that a restart
+# starts again from the initial records.
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = 1
+worker_class = "gthread"
+threads = int(os.getenv("THREADS", multiprocessing.cpu_count() * 2 + 1))
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
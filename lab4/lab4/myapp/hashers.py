@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, identify_hasher
+from django.utils.crypto import constant_time_compare
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    # Same algorithm name and hash format as Django's PBKDF2 hasher, so hashes
+    # are interchangeable, but the cost comes from settings. Changing
+    # PASSWORD_ITERATIONS makes check_password() rehash on the next login.
+    @property
+    def iterations(self):
+        return settings.PASSWORD_ITERATIONS
+
+
+def verify_password(raw_password, stored, setter):
+    # Passwords saved before hashing was introduced are plaintext; accept them
+    # once and let the setter replace them with a hash.
+    try:
+        identify_hasher(stored)
+    except ValueError:
+        if constant_time_compare(raw_password, stored):
+            setter(raw_password)
+            return True
+        return False
+    return check_password(raw_password, stored, setter)
@@ -0,0 +1,82 @@
+import threading
+
+
+class InMemoryRepository:
+    # Records are kept in a dict keyed by id, with secondary indexes mapping a
+    # field value to the ids that carry it, so lookups by id or by an indexed
+    # field do not scan the table. Ids come from a counter and are never
+    # reused after a delete. Records returned by the repository must not be
+    # modified in place; use update() so that the indexes stay in sync.
+
+    def __init__(self, indexed_fields=(), records=()):
+        self._records = {}
+        self._indexes = {field: {} for field in indexed_fields}
+        self._next_id = 1
+        self._lock = threading.RLock()
+        for record in records:
+            self.add(record)
+
+    def allocate_id(self):
+        with self._lock:
+            record_id = self._next_id
+            self._next_id += 1
+            return record_id
+
+    def add(self, record):
+        with self._lock:
+            record = dict(record)
+            if 'id' not in record:
+                record['id'] = self.allocate_id()
+            self._next_id = max(self._next_id, record['id'] + 1)
+            self._records[record['id']] = record
+            self._index(record)
+            return record
+
+    def get(self, record_id):
+        return self._records.get(record_id)
+
+    def get_by(self, field, value):
+        with self._lock:
+            for record_id in self._indexes[field].get(value, ()):
+                return self._records[record_id]
+            return None
+
+    def filter_by(self, field, value):
+        with self._lock:
+            return [self._records[record_id] for record_id in self._indexes[field].get(value, ())]
+
+    def update(self, record_id, **fields):
+        with self._lock:
+            record = self._records.get(record_id)
+            if record is None:
+                return None
+            self._unindex(record)
+            record.update(fields)
+            self._index(record)
+            return record
+
+    def delete(self, record_id):
+        with self._lock:
+            record = self._records.pop(record_id, None)
+            if record is not None:
+                self._unindex(record)
+            return record
+
+    def all(self):
+        with self._lock:
+            return list(self._records.values())
+
+    def __len__(self):
+        return len(self._records)
+
+    def _index(self, record):
+        for field, index in self._indexes.items():
+            index.setdefault(record.get(field), {})[record['id']] = None
+
+    def _unindex(self, record):
+        for field, index in self._indexes.items():
+            ids = index.get(record.get(field))
+            if ids is not None:
+                ids.pop(record['id'], None)
+                if not ids:
+                    del index[record.get(field)]
@@ -1,21 +1,26 @@
 from django.shortcuts import render, redirect
+from django.contrib.auth.hashers import make_password
 from django.http import HttpResponse
+from myapp.hashers import verify_password
+from myapp.repository import InMemoryRepository
 
-users = [
-    {"id": 1, "name": "admin", "age": 30, "password": "admin", "role": "admin", "token": "admin-token"},
-    {"id": 2, "name": "test", "age": 25, "password": "test", "role": "user", "token": "test-token"}
-]
+users = InMemoryRepository(indexed_fields=('token', 'name'), records=[
+    {"id": 1, "name": "admin", "age": 30, "password": make_password("admin"), "role": "admin", "token": "admin-token"},
+    {"id": 2, "name": "test", "age": 25, "password": make_password("test"), "role": "user", "token": "test-token"}
+])
 
-products = [
+products = InMemoryRepository(records=[
     {"id": 1, "name": "Product 1", "price": 100},
     {"id": 2, "name": "Product 2", "price": 200}
-]
+])
 
 def get_user_by_token(token):
-    for user in users:
-        if user['token'] == token:
-            return user
-    return None
+    return users.get_by('token', token)
+
+def check_user_password(user, password):
+    def upgrade(raw_password):
+        users.update(user['id'], password=make_password(raw_password))
+    return verify_password(password, user['password'], upgrade)
 
 def index(request):
     auth_token = request.COOKIES.get('auth_token')
@@ -24,7 +29,7 @@ def index(request):
     if not user:
         return redirect('login')
     
-    return render(request, 'index.html', {'user': user, 'products': products})
+    return render(request, 'index.html', {'user': user, 'products': products.all()})
 
 def create_product(request):
     auth_token = request.COOKIES.get('auth_token')
@@ -36,7 +41,7 @@ def create_product(request):
     if request.method == 'POST':
         name = request.POST['name']
         price = int(request.POST['price'])
-        products.append({"id": len(products) + 1, "name": name, "price": price})
+        products.add({"name": name, "price": price})
         return redirect('index')
     
     return render(request, 'create_product.html')
@@ -45,7 +50,7 @@ def login(request):
     if request.method == 'POST':
         username = request.POST['username']
         password = request.POST['password']
-        user = next((u for u in users if u['name'] == username and u['password'] == password), None)
+        user = next((u for u in users.filter_by('name', username) if check_user_password(u, password)), None)
         if user:
             if user['role'] == 'admin':
                 response = redirect('admin_panel')
@@ -64,8 +69,9 @@ def register(request):
         username = request.POST['username']
         password = request.POST['password']
         age = int(request.POST['age'])
-        token = f'user-{len(users) + 1}-token'
-        users.append({"id": len(users) + 1, "name": username, "password": password, "age": age, "token": token, "role": "user"})
+        user_id = users.allocate_id()
+        token = f'user-{user_id}-token'
+        users.add({"id": user_id, "name": username, "password": make_password(password), "age": age, "token": token, "role": "user"})
         response = redirect('index')
         response.set_cookie('auth_token', token)
         return response
@@ -80,8 +86,7 @@ def delete_user(request, user_id):
     if not user or user['role'] != 'admin':
         return redirect('login')
 
-    global users
-    users = [u for u in users if u['id'] != int(user_id)]
+    users.delete(int(user_id))
 
     return redirect('admin_panel')
 
@@ -96,14 +101,10 @@ def update_user(request, user_id):
     if request.method == 'POST':
         username = request.POST['username']
         age = int(request.POST['age'])
-        for u in users:
-            if u['id'] == int(user_id):
-                u['name'] = username
-                u['age'] = age
-                break
+        users.update(int(user_id), name=username, age=age)
         return redirect('admin_panel')
 
-    user_to_update = next((u for u in users if u['id'] == int(user_id)), None)
+    user_to_update = users.get(int(user_id))
     return render(request, 'update_user.html', {'user_to_update': user_to_update})
 
 
@@ -114,8 +115,7 @@ def delete_product(request, product_id):
     if not user or user['role'] != 'admin':
         return redirect('login')
 
-    global products
-    products = [p for p in products if p['id'] != int(product_id)]
+    products.delete(int(product_id))
 
     return redirect('admin_panel')
 
@@ -130,14 +130,10 @@ def update_product(request, product_id):
     if request.method == 'POST':
         name = request.POST['name']
         price = int(request.POST['price'])
-        for p in products:
-            if p['id'] == int(product_id):
-                p['name'] = name
-                p['price'] = price
-                break
+        products.update(int(product_id), name=name, price=price)
         return redirect('admin_panel')
 
-    product_to_update = next((p for p in products if p['id'] == int(product_id)), None)
+    product_to_update = products.get(int(product_id))
     return render(request, 'update_product.html', {'product_to_update': product_to_update})
 
 
@@ -149,4 +145,4 @@ def admin_panel(request):
     if not user or user['role'] != 'admin':
         return redirect('login')
 
-    return render(request, 'admin_panel.html', {'users': users, 'products': products})
+    return render(request, 'admin_panel.html', {'users': users.all(), 'products': products.all()})
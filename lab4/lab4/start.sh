@@ -0,0 +1,6 @@
+#!/bin/sh
+# SERVER_MODE=development runs the development server instead.
+if [ "$SERVER_MODE" = "development" ]; then
+    exec python manage.py runserver 0.0.0.0:8000
+fi
+exec gunicorn -c gunicorn.conf.py lab4.wsgi
@@ -0,0 +1,31 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# Production server: gunicorn with threaded workers, the usual 2 * CPUs + 1
+# processes by default (WEB_CONCURRENCY overrides it). Send SIGHUP for a
+# graceful restart: new workers are started and the old ones finish their
+# requests first.
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("THREADS", "2"))
+# Import the app once in the master and fork ready workers from it.
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then, at different times, so leaks cannot pile up.
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+# The catalog versions behind the ETags live in the Django cache, which has
+# to be shared between the workers (see CACHES in settings.py).
+os.environ.setdefault("DJANGO_CACHE_DIR", "/dev/shm/lab5-cache")
+
+
+def on_starting(server):
+    # Create the admin once, before the workers start, so that none of them
+    # has to. Fails harmlessly before the first migrate, which creates it.
+    subprocess.run([sys.executable, "manage.py", "create_default_admin"])
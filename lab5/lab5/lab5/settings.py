@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from myapp.metrics import INSTRUMENTATION_ENABLED
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,17 +47,29 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'myapp.conditional_get.DjangoConditionalGetMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Pages answered with 304 Not Modified when the client's ETag is current.
+CONDITIONAL_GET_VALIDATORS = {
+    '/': 'myapp.catalog.index_validator',
+    '/search/': 'myapp.catalog.search_validator',
+}
+
+# Request timing, SQL and template profiling, switched on by METRICS=1 or
+# SERVER_TIMING=1 (see myapp/metrics.py).
+if INSTRUMENTATION_ENABLED:
+    MIDDLEWARE.insert(0, 'myapp.metrics.DjangoMetricsMiddleware')
+
 ROOT_URLCONF = 'lab5.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'myapp.metrics.TimedDjangoTemplates' if INSTRUMENTATION_ENABLED else 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,10 +96,37 @@ DATABASES = {
     }
 }
 
+# The catalog versions in myapp/catalog.py and the statistics in
+# myapp/stats.py are kept in the cache. The default local-memory cache is per
+# process; with several workers set DJANGO_CACHE_DIR (gunicorn.conf.py does)
+# or DJANGO_CACHE_TABLE (after manage.py createcachetable) so that they all
+# see the same values.
+if os.getenv('DJANGO_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('DJANGO_CACHE_DIR'),
+        }
+    }
+elif os.getenv('DJANGO_CACHE_TABLE'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.getenv('DJANGO_CACHE_TABLE'),
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+PASSWORD_HASHERS = [
+    'myapp.hashers.TunablePBKDF2PasswordHasher',
+]
+
+# PBKDF2 cost, tuned per deployment. Stored hashes are upgraded on next login.
+PASSWORD_ITERATIONS = int(os.getenv('PASSWORD_ITERATIONS', '600000'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
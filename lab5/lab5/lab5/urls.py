@@ -31,6 +31,10 @@ urlpatterns = [
     path('update_product/<int:product_id>/', views.update_product, name='update_product'),
     path('search/', views.search_products, name='search_products'),
     path('user_count/', views.user_count, name='user_count'),
+    path('sorted_users/', views.sorted_users, name='sorted_users'),
+    path('stats/', views.catalog_stats, name='catalog_stats'),
+    path('bulk/products/', views.bulk_products, name='bulk_products'),
+    path('bulk/users/', views.bulk_users, name='bulk_users'),
     # path('admin/', admin.site.urls),
 ]
 
@@ -0,0 +1,43 @@
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+
+from myapp.models import User
+
+# Key of the PostgreSQL advisory lock held while the admin is bootstrapped.
+ADMIN_LOCK_ID = 5021
+
+
+def lock_bootstrap(connection):
+    # Held until the end of the transaction, so that of several processes
+    # bootstrapping at once (workers, containers) only one looks for the
+    # admin and creates it at a time; the others wait, then find it.
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [ADMIN_LOCK_ID])
+        elif connection.vendor == 'sqlite':
+            # Any write takes SQLite's database write lock, even one that
+            # matches no row (ids start at 1). Taking it before the lookup
+            # makes a concurrent bootstrap wait for the busy timeout instead
+            # of failing with "database is locked" at its insert.
+            cursor.execute(f'UPDATE {User._meta.db_table} SET id = id WHERE id = 0')
+        else:
+            raise NotImplementedError(f'No bootstrap lock for the {connection.vendor} backend.')
+
+
+def create_default_admin(using='default'):
+    # Runs after migrate and from the create_default_admin command.
+    with transaction.atomic(using=using):
+        lock_bootstrap(connections[using])
+        users = User.objects.using(using)
+        if users.filter(role='admin').exists():
+            return
+        users.create(
+            name='admin',
+            role='admin',
+            password=make_password('admin'),
+            age=30,
+            token=str(uuid.uuid4()),
+        )
+    print("Default admin created: username=admin, password=admin")
@@ -0,0 +1,33 @@
+import time
+from django.core.cache import cache
+
+
+def version(model_name):
+    key = f'version:{model_name}'
+    value = cache.get(key)
+    if value is None:
+        # Start from the clock, so that a cache that was emptied (for example
+        # by a restart with the local-memory backend) never hands out a
+        # version that an earlier ETag was built from.
+        cache.add(key, time.time_ns())
+        value = cache.get(key)
+    return value
+
+
+def bump(model_name):
+    key = f'version:{model_name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns())
+
+
+def index_validator(request):
+    auth_token = request.COOKIES.get('auth_token')
+    if not auth_token:
+        return None
+    return (version('product'), version('user'), auth_token, request.GET.urlencode())
+
+
+def search_validator(request):
+    return (version('product'), request.GET.urlencode())
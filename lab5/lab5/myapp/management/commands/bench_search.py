@@ -0,0 +1,59 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from myapp.models import Product
+from myapp.search import search_products
+
+WORDS = [
+    'laptop', 'phone', 'tablet', 'monitor', 'keyboard', 'mouse', 'camera', 'speaker',
+    'charger', 'cable', 'router', 'printer', 'headset', 'watch', 'drive', 'adapter',
+    'wireless', 'portable', 'gaming', 'office', 'pro', 'mini', 'ultra', 'smart',
+]
+QUERIES = ['lap', 'wireless mouse', 'gaming key', 'ultra', 'smart wat', 'portable speaker pro']
+
+
+class Command(BaseCommand):
+    help = 'Compare FTS product search with the icontains scan on a throwaway database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            self.populate(options['products'], options['seed'])
+            self.stdout.write(f"{'query':<22} {'fts ms':>10} {'icontains ms':>14} {'hits':>8}")
+            for query in QUERIES:
+                fts = self.measure(lambda: search_products(query), options['repeat'])
+                scan = self.measure(
+                    lambda: list(Product.objects.filter(name__icontains=query).order_by('name')[:20]),
+                    options['repeat'],
+                )
+                hits = Product.objects.filter(name__icontains=query.split()[0]).count()
+                self.stdout.write(f'{query:<22} {fts:>10.3f} {scan:>14.3f} {hits:>8}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def populate(self, count, seed):
+        rng = random.Random(seed)
+        batch = []
+        for i in range(count):
+            name = ' '.join(rng.sample(WORDS, 3)) + f' {i}'
+            batch.append(Product(name=name, price=rng.randint(1, 5000)))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+
+    def measure(self, run, repeat):
+        run()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        return (time.perf_counter() - started) / repeat * 1000
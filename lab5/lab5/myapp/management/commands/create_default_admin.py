@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from myapp import bootstrap
+from myapp.models import User
+
+
+class Command(BaseCommand):
+    help = 'Create the default admin (admin/admin) unless an admin exists. migrate does this too.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if User._meta.db_table not in connections[using].introspection.table_names():
+            raise CommandError('The users table does not exist yet, run migrate first.')
+        bootstrap.create_default_admin(using)
@@ -0,0 +1,177 @@
+import json
+import re
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from myapp import bootstrap, views
+from myapp.models import Product, User
+
+SQLITE_SCAN_RE = re.compile(r'SCAN (?:TABLE )?(\w+)$')
+POSTGRES_SCAN_RE = re.compile(r'(?:->\s*)?Seq Scan on (\w+)')
+POSTGRES_SORT_RE = re.compile(r'(?:->\s*)?Sort\b')
+
+SEARCH_TRIGGERS = {'myapp_product_fts_ai', 'myapp_product_fts_ad', 'myapp_product_fts_au'}
+
+# Views whose plan is known to need a scan or a sort, and why. Anything else
+# that shows up flagged is an index regression.
+EXPECTED = {
+    'search': 'every match is sorted by bm25 rank',
+}
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN every query the views run on a throwaway database and flag full scans and sorts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='users and products created before the views run')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            self.check_search_triggers()
+            self.populate(options['rows'])
+            flagged = 0
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                for label, view, method, kwargs, data, who in self.scenarios():
+                    flagged += self.audit(label, view, method, kwargs, data, who)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if flagged:
+            raise CommandError(f'{flagged} queries need a full scan or a sort, see above')
+        self.stdout.write('no unexpected full scans or sorts')
+
+    def check_search_triggers(self):
+        # A migration that remakes myapp_product on SQLite drops the FTS
+        # triggers, and search then silently misses every later write.
+        if connection.vendor != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'myapp_product'")
+            found = {row[0] for row in cursor.fetchall()}
+        missing = SEARCH_TRIGGERS - found
+        if missing:
+            raise CommandError(f'FTS triggers missing after migrate: {", ".join(sorted(missing))}')
+
+    def populate(self, rows):
+        password = make_password('password')
+        User.objects.bulk_create(
+            User(name=f'user-{i}', age=20 + i % 50, password=password, token=f'token-{i}', role='user')
+            for i in range(rows)
+        )
+        Product.objects.bulk_create(Product(name=f'Product {i}', price=i % 500 + 1) for i in range(rows))
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def scenarios(self):
+        admin = User.objects.get(role='admin')
+        user = User.objects.filter(role='user').order_by('id').first()
+        other = User.objects.filter(role='user').order_by('-id').first()
+        product = Product.objects.order_by('id').first()
+        other_product = Product.objects.order_by('-id').first()
+        return [
+            ('bootstrap', self.bootstrap, 'post', {}, {}, None),
+            ('login', views.login, 'post', {}, {'username': user.name, 'password': 'password'}, None),
+            ('register', views.register, 'post', {}, {'name': 'new-user', 'age': 30, 'password': 'password'}, None),
+            ('index', views.index, 'get', {}, None, user),
+            ('create_product', views.create_product, 'post', {}, {'name': 'New product', 'price': 10}, user),
+            ('search', views.search_products, 'get', {}, {'q': 'product 1'}, user),
+            ('search_all', views.search_products, 'get', {}, {'page': 2}, user),
+            ('admin_panel', views.admin_panel, 'get', {}, None, admin),
+            ('sorted_users', views.sorted_users, 'get', {}, None, admin),
+            ('user_count', views.user_count, 'get', {}, None, admin),
+            ('update_user', views.update_user, 'post', {'user_id': user.id}, {'username': user.name, 'age': 31}, admin),
+            ('update_product', views.update_product, 'post', {'product_id': product.id}, {'name': product.name, 'price': 20}, admin),
+            ('delete_product', views.delete_product, 'post', {'product_id': other_product.id}, {}, admin),
+            ('delete_user', views.delete_user, 'post', {'user_id': other.id}, {}, admin),
+            ('bulk_products', views.bulk_products, 'post', {}, json.dumps([
+                {'op': 'create', 'name': 'Bulk product', 'price': '9.99'},
+                {'op': 'update', 'id': product.id, 'price': 30},
+                {'op': 'delete', 'id': other_product.id - 1},
+            ]), admin),
+            ('bulk_users', views.bulk_users, 'post', {}, json.dumps([
+                {'op': 'update', 'id': user.id, 'age': 32},
+                {'op': 'delete', 'id': other.id - 1},
+            ]), admin),
+        ]
+
+    def bootstrap(self, request):
+        # Not a view: the admin bootstrap that migrate and gunicorn run.
+        bootstrap.create_default_admin()
+        return HttpResponse()
+
+    def audit(self, label, view, method, kwargs, data, who):
+        if isinstance(data, str):
+            request = getattr(RequestFactory(), method)('/', data, content_type='application/json')
+        else:
+            request = getattr(RequestFactory(), method)('/', data)
+        if who is not None:
+            request.COOKIES['auth_token'] = who.token
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            # executemany is explained with its first set of parameters.
+            queries.append((sql, params[0] if many else params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = view(request, **kwargs)
+            if response.streaming:
+                # Streamed pages query while the content is consumed.
+                b''.join(response.streaming_content)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        flagged = 0
+        for sql, params in queries:
+            if not sql.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+                continue
+            plan = self.explain(sql, params)
+            problems = self.problems(sql, plan)
+            self.stdout.write(f'  {sql[:120]}')
+            for line in plan:
+                self.stdout.write(f'      {line}')
+            if problems and label in EXPECTED:
+                self.stdout.write(f'    expected: {EXPECTED[label]}')
+            elif problems:
+                flagged += 1
+                self.stdout.write(self.style.ERROR(f'    {", ".join(problems)}'))
+        return flagged
+
+    def explain(self, sql, params):
+        # EXPLAIN ANALYZE runs the statement, so it is rolled back, and
+        # sequential scans are disabled so that any usable index is used.
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+            plan = [row[0] for row in cursor.fetchall()]
+            transaction.set_rollback(True)
+            return plan
+
+    def problems(self, sql, plan):
+        # A scan is only a problem when the query filters; listing a whole
+        # table is what the admin pages are meant to do.
+        tables = set(connection.introspection.table_names())
+        filtered = ' WHERE ' in sql.upper()
+        found = []
+        for line in plan:
+            line = line.strip()
+            if connection.vendor == 'sqlite':
+                scan = SQLITE_SCAN_RE.match(line)
+                sort = line.startswith('USE TEMP B-TREE')
+            else:
+                scan = POSTGRES_SCAN_RE.match(line)
+                sort = POSTGRES_SORT_RE.match(line)
+            if scan and filtered and scan.group(1) in tables:
+                found.append(f'full scan of {scan.group(1)}')
+            if sort:
+                found.append('sort')
+        return found
@@ -0,0 +1,26 @@
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from myapp import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached user and product statistics and report any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help='keep running, reconciling every this many seconds')
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            self.stderr.write('The local-memory cache belongs to each process; only STATS_TIMEOUT reconciles the servers.')
+        while True:
+            drift = stats.reconcile()
+            for name, (cached, actual) in drift.items():
+                self.stdout.write(f'{name}: cached {cached}, actual {actual}')
+            self.stdout.write(f'reconciled, {len(drift)} values had drifted')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
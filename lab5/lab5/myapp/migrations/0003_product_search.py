@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# SQLite FTS5 index over Product.name. It is an external-content table, so
+# the names are stored once (in myapp_product) and the triggers keep the
+# index in sync with every write, including QuerySet.update() and raw SQL.
+# prefix='2 3' adds prefix indexes so "lap*" style queries stay cheap.
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE myapp_product_fts USING fts5("
+    "name, content='myapp_product', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER myapp_product_fts_ai AFTER INSERT ON myapp_product BEGIN "
+    "INSERT INTO myapp_product_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER myapp_product_fts_ad AFTER DELETE ON myapp_product BEGIN "
+    "INSERT INTO myapp_product_fts(myapp_product_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER myapp_product_fts_au AFTER UPDATE OF name ON myapp_product BEGIN "
+    "INSERT INTO myapp_product_fts(myapp_product_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO myapp_product_fts(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO myapp_product_fts(myapp_product_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS myapp_product_fts_au",
+    "DROP TRIGGER IF EXISTS myapp_product_fts_ad",
+    "DROP TRIGGER IF EXISTS myapp_product_fts_ai",
+    "DROP TABLE IF EXISTS myapp_product_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_alter_user_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_product_search'),
+    ]
+
+    operations = [
+        # AddIndex only runs CREATE INDEX; AlterField(db_index=True) would
+        # remake myapp_product on SQLite and drop the FTS triggers.
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='myapp_product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['name'], name='myapp_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role'], name='myapp_user_role_idx'),
+        ),
+    ]
@@ -12,6 +12,16 @@ class User(models.Model):
     token = models.CharField(max_length=255, unique=True)
     role = models.CharField(max_length=10, choices=ROLES)
 
+    class Meta:
+        # Meta.indexes rather than db_index: on SQLite, AlterField remakes
+        # the table, which drops the FTS triggers of 0003_product_search.
+        # login looks users up by name, the admin bootstrap
+        # (myapp/bootstrap.py) by role.
+        indexes = [
+            models.Index(fields=['name'], name='myapp_user_name_idx'),
+            models.Index(fields=['role'], name='myapp_user_role_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -19,6 +29,9 @@ class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [models.Index(fields=['price'], name='myapp_product_price_idx')]
+
     def __str__(self):
         return self.name
 
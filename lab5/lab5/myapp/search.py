@@ -0,0 +1,43 @@
+import re
+
+from django.db import connection
+
+from myapp.models import Product
+
+SEARCH_PAGE_SIZE = 20
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def match_expression(query):
+    # Every word must match, the last one as a prefix so results show up
+    # while the user is still typing.
+    terms = TOKEN_RE.findall(query.lower())
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' AND '.join(quoted)
+
+
+def search_products(query, page=1, page_size=SEARCH_PAGE_SIZE):
+    # Returns (products, has_next). Results are ranked by bm25 on SQLite and
+    # fall back to a name-ordered icontains scan on other databases.
+    offset = (page - 1) * page_size
+    if connection.vendor != 'sqlite':
+        products = list(Product.objects.filter(name__icontains=query).order_by('name')[offset:offset + page_size + 1])
+        return products[:page_size], len(products) > page_size
+
+    match = match_expression(query)
+    if match is None:
+        return [], False
+    # Every match is scored before the page is cut from the ranked list, so
+    # any page can be reached; rowid breaks ties so pages do not overlap.
+    products = list(Product.objects.raw(
+        'SELECT p.id, p.name, p.price FROM ('
+        'SELECT rowid, rank FROM myapp_product_fts WHERE myapp_product_fts MATCH %s '
+        'ORDER BY rank, rowid LIMIT %s OFFSET %s'
+        ') f JOIN myapp_product p ON p.id = f.rowid ORDER BY f.rank, f.rowid',
+        [match, page_size + 1, offset],
+    ))
+    return products[:page_size], len(products) > page_size
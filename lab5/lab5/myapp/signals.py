@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from myapp import bootstrap, catalog, stats
+from myapp.models import Product, User
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, **kwargs):
+    catalog.bump('product')
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, **kwargs):
+    catalog.bump('user')
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.product_added(instance.price)
+    else:
+        # The old price is gone by now; let the totals be recomputed.
+        stats.invalidate('price_cents', 'price_min', 'price_max')
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    stats.product_removed(instance.price)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, created, **kwargs):
+    if created:
+        stats.user_added()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, **kwargs):
+    stats.user_removed()
+
+
+def create_default_admin(sender, apps, using, **kwargs):
+    # post_migrate of myapp (connected in MyappConfig.ready). Skipped when
+    # the users table has been migrated away.
+    try:
+        apps.get_model('myapp', 'User')
+    except LookupError:
+        return
+    bootstrap.create_default_admin(using)
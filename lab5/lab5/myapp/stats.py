@@ -0,0 +1,133 @@
+import os
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Max, Min, Sum
+
+from myapp.models import Product, User
+
+# User and product counts and product price aggregates, kept in the Django
+# cache (one key each) so that reading them costs no query. Counts and the
+# price total (in cents) are adjusted with cache.incr() by the model signals
+# and the views; min/max are dropped whenever a change could move them and
+# read back from the price index. A missing key is recomputed on first read,
+# entries expire after STATS_TIMEOUT seconds, and manage.py reconcile_stats
+# recomputes everything, so changes that bypass the signals (bulk_create,
+# raw SQL, lost increments on a non-atomic cache) cannot leave them wrong
+# for long.
+STATS_TIMEOUT = int(os.getenv('STATS_TIMEOUT', '3600'))
+
+NAMES = ['users', 'products', 'price_cents', 'price_min', 'price_max']
+
+
+def cents(price):
+    return int((Decimal(str(price)) * 100).to_integral_value())
+
+
+def compute(name):
+    if name == 'users':
+        return User.objects.count()
+    if name == 'products':
+        return Product.objects.count()
+    if name == 'price_cents':
+        return cents(Product.objects.aggregate(total=Sum('price'))['total'] or 0)
+    value = Product.objects.aggregate(value=Min('price') if name == 'price_min' else Max('price'))['value']
+    # None (no products) cannot be cached, so an empty table is stored as ''.
+    return '' if value is None else cents(value)
+
+
+def get(name):
+    value = cache.get(f'stats:{name}')
+    if value is None:
+        value = compute(name)
+        cache.add(f'stats:{name}', value, STATS_TIMEOUT)
+    return value
+
+
+def adjust(name, delta):
+    # A missing key stays missing and is recomputed on the next read.
+    try:
+        cache.incr(f'stats:{name}', delta)
+    except ValueError:
+        pass
+
+
+def invalidate(*names):
+    cache.delete_many([f'stats:{name}' for name in names])
+
+
+def user_added():
+    adjust('users', 1)
+
+
+def user_removed():
+    adjust('users', -1)
+
+
+def product_added(price):
+    adjust('products', 1)
+    adjust('price_cents', cents(price))
+    price_moved(None, cents(price))
+
+
+def product_removed(price):
+    adjust('products', -1)
+    adjust('price_cents', -cents(price))
+    price_moved(cents(price), None)
+
+
+def price_changed(old_price, new_price):
+    adjust('price_cents', cents(new_price) - cents(old_price))
+    price_moved(cents(old_price), cents(new_price))
+
+
+def products_bulk_changed(added, repriced):
+    # The bulk view's bulk_create and UPDATEs send no signals. added: prices
+    # of the new products, repriced: (old, new) price pairs. One increment
+    # per value, and min/max are read back from the index.
+    adjust('products', len(added))
+    adjust('price_cents', sum(cents(p) for p in added) + sum(cents(new) - cents(old) for old, new in repriced))
+    invalidate('price_min', 'price_max')
+
+
+def price_moved(old, new):
+    # Drop min/max if the price that left was one of them or the one that
+    # arrived is beyond them; they are read back from the index.
+    values = cache.get_many(['stats:price_min', 'stats:price_max'])
+    low, high = values.get('stats:price_min'), values.get('stats:price_max')
+    if low is not None and (low == '' or old == low or (new is not None and new < low)):
+        invalidate('price_min')
+    if high is not None and (high == '' or old == high or (new is not None and new > high)):
+        invalidate('price_max')
+
+
+def price(value_cents):
+    return (Decimal(value_cents) / 100).quantize(Decimal('0.01'))
+
+
+def snapshot():
+    values = {name: get(name) for name in NAMES}
+    products = values['products']
+    return {
+        'users': values['users'],
+        'products': products,
+        'price_min': price(values['price_min']) if values['price_min'] != '' else None,
+        'price_max': price(values['price_max']) if values['price_max'] != '' else None,
+        'price_avg': price(Decimal(values['price_cents']) / products) if products else None,
+        'reconciled_at': cache.get('stats:reconciled_at'),
+    }
+
+
+def reconcile():
+    # Recomputes every value and returns {name: (cached, actual)} for the
+    # ones that had drifted.
+    drift = {}
+    for name in NAMES:
+        cached = cache.get(f'stats:{name}')
+        actual = compute(name)
+        if cached is not None and cached != actual:
+            drift[name] = (cached, actual)
+        cache.set(f'stats:{name}', actual, STATS_TIMEOUT)
+    cache.set('stats:reconciled_at', time.time(), None)
+    return drift
@@ -0,0 +1,43 @@
+import os
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+# Rows fetched per database round trip and rendered per piece of the response.
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', '1000'))
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_page(request, template_name, sections):
+    # The page template is rendered once with a marker where each section's
+    # rows go. sections is a list of (name, row template, queryset); the rows
+    # are read with iterator() and rendered STREAM_CHUNK_SIZE at a time, so
+    # memory stays bounded and the head of the page goes out right away.
+    markers = {name: mark_safe(f'<!--stream:{name}-->') for name, _, _ in sections}
+    page = render_to_string(template_name, markers, request)
+    # {% csrf_token %} in the rows is rendered after the headers are sent, so
+    # the CSRF cookie has to be requested now.
+    get_token(request)
+
+    def generate():
+        rest = page
+        for name, row_template, rows in sections:
+            head, rest = rest.split(markers[name], 1)
+            yield head
+            template = get_template(row_template)
+            for chunk in chunks(rows.iterator(chunk_size=STREAM_CHUNK_SIZE), STREAM_CHUNK_SIZE):
+                yield template.render({name: chunk}, request)
+        yield rest
+
+    return StreamingHttpResponse(generate())
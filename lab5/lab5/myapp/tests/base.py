@@ -0,0 +1,19 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from myapp.models import User
+
+
+class AdminTestCase(TestCase):
+    def setUp(self):
+        # Statistics and catalog versions live in the cache, which outlives
+        # the rolled back test transactions.
+        cache.clear()
+        self.admin = User.objects.create(name='boss', age=40, password='x', token='admin-token', role='admin')
+        self.client.cookies['auth_token'] = self.admin.token
+
+    def bulk(self, path, rows, client=None, **extra):
+        client = client or self.client
+        return client.post(path, json.dumps(rows), content_type='application/json', **extra)
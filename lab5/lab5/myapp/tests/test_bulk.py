@@ -0,0 +1,111 @@
+import csv
+import io
+from decimal import Decimal
+
+from django.test import Client
+
+from myapp.models import Product, User
+from myapp.tests.base import AdminTestCase
+
+
+class BulkProductsTest(AdminTestCase):
+    def test_valid_rows_are_applied_and_invalid_rows_reported(self):
+        kept = Product.objects.create(name='Kept', price=Decimal('1.00'))
+        response = self.bulk('/bulk/products/', [
+            {'op': 'create', 'name': 'Tea', 'price': '3.50'},
+            {'op': 'create', 'name': 'Cake', 'price': 'cheap'},
+            {'op': 'update', 'id': kept.id, 'price': '2.00'},
+            {'op': 'delete', 'id': 999999},
+            {'op': 'delete', 'id': kept.id},
+            {'op': 'merge', 'id': kept.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['created'], report['updated'], report['deleted'], report['failed']), (1, 1, 0, 4))
+        statuses = [(entry['row'], entry['status'], entry.get('error')) for entry in report['results']]
+        self.assertEqual(statuses, [
+            (1, 'created', None),
+            (2, 'error', 'price must be a number'),
+            (3, 'updated', None),
+            (4, 'error', 'not found'),
+            (5, 'error', 'id appears more than once'),
+            (6, 'error', 'op must be one of create, update, delete'),
+        ])
+        tea = Product.objects.get(name='Tea')
+        self.assertEqual(report['results'][0]['id'], tea.id)
+        self.assertEqual(tea.price, Decimal('3.50'))
+        self.assertEqual(Product.objects.get(id=kept.id).price, Decimal('2.00'))
+        self.assertFalse(Product.objects.filter(name='Cake').exists())
+
+    def test_csv_payload_skips_empty_cells(self):
+        product = Product.objects.create(name='Old name', price=Decimal('5.00'))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['op', 'id', 'name', 'price'])
+        writer.writerow(['update', product.id, '', '6.25'])
+        writer.writerow(['create', '', 'Scone, plain', '1.10'])
+        writer.writerow(['create', '', 'Bun', ''])
+        response = self.client.post('/bulk/products/', buffer.getvalue(), content_type='text/csv')
+        report = response.json()
+        self.assertEqual([entry['status'] for entry in report['results']], ['updated', 'created', 'error'])
+        self.assertEqual(report['results'][2]['error'], 'price is required')
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.price), ('Old name', Decimal('6.25')))
+        self.assertEqual(Product.objects.get(name='Scone, plain').price, Decimal('1.10'))
+
+    def test_updates_with_different_fields(self):
+        a, b, c = (Product.objects.create(name=name, price=Decimal('1.00')) for name in 'abc')
+        report = self.bulk('/bulk/products/', [
+            {'op': 'update', 'id': a.id, 'price': '2.00'},
+            {'op': 'update', 'id': b.id, 'name': 'bee'},
+            {'op': 'update', 'id': c.id, 'name': 'sea', 'price': '3.00'},
+        ]).json()
+        self.assertEqual(report['updated'], 3)
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('name', 'price')),
+            [('a', Decimal('2.00')), ('bee', Decimal('1.00')), ('sea', Decimal('3.00'))],
+        )
+
+    def test_rejects_bad_requests(self):
+        response = self.client.post('/bulk/products/', 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.bulk('/bulk/products/', []).json(), {'detail': 'no rows'})
+        self.assertEqual(self.client.get('/bulk/products/').status_code, 405)
+
+    def test_requires_admin(self):
+        User.objects.create(name='joe', age=20, password='x', token='user-token', role='user')
+        self.client.cookies['auth_token'] = 'user-token'
+        response = self.bulk('/bulk/products/', [{'op': 'create', 'name': 'Tea', 'price': '1'}])
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Product.objects.exists())
+
+    def test_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.cookies['auth_token'] = self.admin.token
+        rows = [{'op': 'create', 'name': 'Tea', 'price': '1'}]
+        self.assertEqual(self.bulk('/bulk/products/', rows, client).status_code, 403)
+        client.cookies['csrftoken'] = 'a' * 32
+        response = self.bulk('/bulk/products/', rows, client, HTTP_X_CSRFTOKEN='a' * 32)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+
+
+class BulkUsersTest(AdminTestCase):
+    def test_updates_and_deletes(self):
+        ann = User.objects.create(name='ann', age=20, password='x', token='t-ann', role='user')
+        bob = User.objects.create(name='bob', age=30, password='x', token='t-bob', role='user')
+        cid = User.objects.create(name='cid', age=40, password='x', token='t-cid', role='user')
+        report = self.bulk('/bulk/users/', [
+            {'op': 'update', 'id': ann.id, 'age': '21'},
+            {'op': 'update', 'id': bob.id, 'name': 'robert', 'age': 31},
+            {'op': 'delete', 'id': cid.id},
+            {'op': 'create', 'name': 'dan', 'age': 50},
+            {'op': 'update', 'id': ann.id, 'age': -1},
+        ]).json()
+        self.assertEqual([entry['status'] for entry in report['results']], ['updated', 'updated', 'deleted', 'error', 'error'])
+        self.assertEqual(report['results'][3]['error'], 'op must be one of update, delete')
+        ann.refresh_from_db()
+        bob.refresh_from_db()
+        self.assertEqual((ann.name, ann.age), ('ann', 21))
+        self.assertEqual((bob.name, bob.age), ('robert', 31))
+        self.assertFalse(User.objects.filter(id=cid.id).exists())
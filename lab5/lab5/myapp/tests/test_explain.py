@@ -0,0 +1,14 @@
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from myapp.management.commands.explain_queries import Command as ExplainQueries
+
+
+class ExplainQueriesTest(TestCase):
+    def test_checks_triggers(self):
+        ExplainQueries().check_search_triggers()
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER myapp_product_fts_au')
+        with self.assertRaises(CommandError):
+            ExplainQueries().check_search_triggers()
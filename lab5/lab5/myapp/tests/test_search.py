@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from myapp import search
+from myapp.models import Product
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for name in ['Red apple', 'Green apple', 'Apple pie', 'Banana']:
+            Product.objects.create(name=name, price=Decimal('1.00'))
+
+    def names(self, query):
+        products, _ = search.search_products(query)
+        return sorted(product.name for product in products)
+
+    def test_prefix_search(self):
+        self.assertEqual(self.names('appl'), ['Apple pie', 'Green apple', 'Red apple'])
+        self.assertEqual(self.names('red app'), ['Red apple'])
+        self.assertEqual(self.names('cherry'), [])
+        self.assertEqual(self.names('""'), [])
+
+    def test_index_follows_changes(self):
+        Product.objects.filter(name='Banana').update(name='Banana apple')
+        Product.objects.filter(name='Red apple').delete()
+        Product.objects.bulk_create([Product(name='Apple juice', price=Decimal('2.00'))])
+        self.assertEqual(self.names('apple'), ['Apple juice', 'Apple pie', 'Banana apple', 'Green apple'])
+        self.assertEqual(self.names('banana'), ['Banana apple'])
+
+    def test_search_page(self):
+        response = self.client.get('/search/', {'q': 'apple'})
+        self.assertContains(response, 'Green apple')
+        self.assertNotContains(response, 'Banana')
+
+    def test_paging(self):
+        Product.objects.bulk_create([Product(name=f'Apple {i}', price=Decimal('1.00')) for i in range(search.SEARCH_PAGE_SIZE)])
+        first, has_next = search.search_products('apple', 1)
+        second, has_more = search.search_products('apple', 2)
+        self.assertEqual((len(first), has_next), (search.SEARCH_PAGE_SIZE, True))
+        self.assertEqual((len(second), has_more), (3, False))
+        self.assertFalse({p.id for p in first} & {p.id for p in second})
+
+    def test_every_match_is_ranked_and_reachable(self):
+        # Over a thousand matches, the best one inserted last: it must still
+        # come first, and paging must reach every match exactly once.
+        Product.objects.bulk_create([Product(name='Apple pie with cream and sugar', price=Decimal('1.00')) for _ in range(1100)])
+        best = Product.objects.create(name='Apple', price=Decimal('1.00'))
+        total = Product.objects.filter(name__icontains='apple').count()
+        first, _ = search.search_products('apple', 1)
+        self.assertEqual(first[0].id, best.id)
+        seen, page, has_next = [], 1, True
+        while has_next:
+            products, has_next = search.search_products('apple', page)
+            seen += [product.id for product in products]
+            page += 1
+        self.assertEqual(len(seen), total)
+        self.assertEqual(len(set(seen)), total)
+        self.assertEqual(page - 1, -(-total // search.SEARCH_PAGE_SIZE))
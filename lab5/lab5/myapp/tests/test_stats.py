@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from myapp import stats
+from myapp.models import Product, User
+from myapp.tests.base import AdminTestCase
+
+
+class StatsTest(AdminTestCase):
+    def assertStatsCurrent(self):
+        # Every cached value matches a fresh count.
+        self.assertEqual(stats.reconcile(), {})
+
+    def test_signals_and_views_keep_stats_current(self):
+        self.assertEqual(stats.snapshot()['products'], 0)
+        cheap = Product.objects.create(name='Cheap', price=Decimal('1.00'))
+        Product.objects.create(name='Dear', price=Decimal('9.00'))
+        snapshot = stats.snapshot()
+        self.assertEqual((snapshot['products'], snapshot['price_min'], snapshot['price_max']), (2, Decimal('1.00'), Decimal('9.00')))
+
+        self.client.post(f'/update_product/{cheap.id}/', {'name': 'Cheap', 'price': '12.50'})
+        snapshot = stats.snapshot()
+        self.assertEqual((snapshot['price_min'], snapshot['price_max'], snapshot['price_avg']), (Decimal('9.00'), Decimal('12.50'), Decimal('10.75')))
+
+        self.client.post(f'/delete_product/{cheap.id}/')
+        snapshot = stats.snapshot()
+        self.assertEqual((snapshot['products'], snapshot['price_min'], snapshot['price_max']), (1, Decimal('9.00'), Decimal('9.00')))
+        self.assertStatsCurrent()
+
+    def test_bulk_changes_keep_stats_current(self):
+        old = Product.objects.create(name='Old', price=Decimal('4.00'))
+        gone = Product.objects.create(name='Gone', price=Decimal('100.00'))
+        stats.snapshot()
+        self.bulk('/bulk/products/', [
+            {'op': 'create', 'name': 'New', 'price': '0.50'},
+            {'op': 'update', 'id': old.id, 'price': '8.00'},
+            {'op': 'delete', 'id': gone.id},
+        ])
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['products'], 2)
+        self.assertEqual((snapshot['price_min'], snapshot['price_max']), (Decimal('0.50'), Decimal('8.00')))
+        self.assertStatsCurrent()
+
+    def test_user_count(self):
+        users = User.objects.count()
+        self.assertEqual(stats.get('users'), users)
+        ann = User.objects.create(name='ann', age=20, password='x', token='t-ann', role='user')
+        self.assertEqual(stats.get('users'), users + 1)
+        self.bulk('/bulk/users/', [{'op': 'delete', 'id': ann.id}])
+        self.assertEqual(stats.get('users'), users)
+        self.assertStatsCurrent()
+
+    def test_reconcile_repairs_drift(self):
+        Product.objects.create(name='Tea', price=Decimal('2.00'))
+        stats.snapshot()
+        Product.objects.bulk_create([Product(name='Unseen', price=Decimal('3.00'))])
+        self.assertEqual(stats.reconcile(), {'products': (1, 2), 'price_cents': (200, 500), 'price_max': (200, 300)})
+        self.assertEqual(stats.snapshot()['products'], 2)
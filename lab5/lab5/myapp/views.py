@@ -1,7 +1,12 @@
 import uuid
-from django.db import IntegrityError
+from decimal import Decimal, InvalidOperation
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, IntegrityError, connection, transaction
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from myapp import bulk, catalog, search, stats
+from myapp.streaming import stream_page
+from myapp.hashers import verify_password
 from myapp.models import Product, ProductForm, User, UserForm
 
 
@@ -9,6 +14,13 @@ def get_user_by_token(token):
     return User.objects.filter(token=token).first()
 
 
+def check_user_password(user, password):
+    def upgrade(raw_password):
+        user.password = make_password(raw_password)
+        user.save(update_fields=['password'])
+    return verify_password(password, user.password, upgrade)
+
+
 def index(request):
     auth_token = request.COOKIES.get('auth_token')
     user = get_user_by_token(auth_token)
@@ -39,13 +51,12 @@ def create_product(request):
 
 
 def login(request):
-    create_default_admin()
     if request.method == 'POST':
         username = request.POST['username']
         password = request.POST['password']
-        user = User.objects.filter(name=username, password=password).first()
+        user = User.objects.filter(name=username).first()
 
-        if user:
+        if user and check_user_password(user, password):
             response = redirect('admin_panel' if user.role == 'admin' else 'index')
             response.set_cookie('auth_token', user.token)
             return response
@@ -61,6 +72,7 @@ def register(request):
         if form.is_valid():
             try:
                 user = form.save(commit=False)
+                user.password = make_password(form.cleaned_data['password'])
                 user.token = str(uuid.uuid4())
                 user.role = 'user'
                 user.save()
@@ -97,6 +109,7 @@ def update_user(request, user_id):
         age = int(request.POST['age'])
 
         User.objects.filter(id=user_id).update(name=username, age=age)
+        catalog.bump('user')
         return redirect('admin_panel')
 
     user_to_update = User.objects.filter(id=user_id).first()
@@ -125,7 +138,11 @@ def update_product(request, product_id):
         name = request.POST['name']
         price = float(request.POST['price'])
 
-        Product.objects.filter(id=product_id).update(name=name, price=price)
+        # update() sends no signals, so the price statistics are adjusted here.
+        old_price = Product.objects.filter(id=product_id).values_list('price', flat=True).first()
+        if Product.objects.filter(id=product_id).update(name=name, price=price):
+            stats.price_changed(old_price, price)
+        catalog.bump('product')
         return redirect('admin_panel')
 
     product_to_update = Product.objects.filter(id=product_id).first()
@@ -139,34 +156,36 @@ def admin_panel(request):
     if not user or user.role != 'admin':
         return redirect('login')
 
-    users = User.objects.all()
-    products = Product.objects.all()
-    return render(request, 'admin_panel.html', {'users': users, 'products': products})
-
-
-def create_default_admin():
-    if not User.objects.filter(role='admin').exists():
-        try:
-            User.objects.create(
-                name='admin',
-                password='admin',
-                age=30,
-                token=str(uuid.uuid4()),
-                role='admin'
-            )
-            print("Default admin created: username=admin, password=admin")
-        except IntegrityError:
-            print("Failed to create admin: Integrity Error")
+    # Only the displayed columns, streamed; see myapp/streaming.py.
+    users = User.objects.order_by('id').values('id', 'name', 'age', 'role')
+    products = Product.objects.order_by('id').values('id', 'name', 'price')
+    return stream_page(request, 'admin_panel.html', [
+        ('users', 'admin_panel_users.html', users),
+        ('products', 'admin_panel_products.html', products),
+    ])
 
 
 def search_products(request):
-    query = request.GET.get('q')
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
     if query:
-        products = Product.objects.filter(name__icontains=query)
+        products, has_next = search.search_products(query, page)
     else:
-        products = Product.objects.all()
+        offset = (page - 1) * search.SEARCH_PAGE_SIZE
+        products = list(Product.objects.order_by('id')[offset:offset + search.SEARCH_PAGE_SIZE + 1])
+        has_next = len(products) > search.SEARCH_PAGE_SIZE
+        products = products[:search.SEARCH_PAGE_SIZE]
 
-    return render(request, 'search_results.html', {'products': products})
+    return render(request, 'search_results.html', {
+        'products': products,
+        'query': query,
+        'page': page,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if has_next else None,
+    })
 
 
 def sorted_users(request):
@@ -176,8 +195,8 @@ def sorted_users(request):
     if not user or user.role != 'admin':
         return redirect('login')
 
-    users = User.objects.all().order_by('name')
-    return render(request, 'sorted_users.html', {'users': users})
+    users = User.objects.order_by('name').values('name', 'age', 'role')
+    return stream_page(request, 'sorted_users.html', [('users', 'sorted_users_rows.html', users)])
 
 
 def user_count(request):
@@ -187,5 +206,145 @@ def user_count(request):
     if not user or user.role != 'admin':
         return redirect('login')
 
-    user_count = User.objects.count()
-    return render(request, 'user_count.html', {'user_count': user_count})
\ No newline at end of file
+    return render(request, 'user_count.html', {'user_count': stats.get('users')})
+
+
+def catalog_stats(request):
+    auth_token = request.COOKIES.get('auth_token')
+    user = get_user_by_token(auth_token)
+
+    if not user or user.role != 'admin':
+        return redirect('login')
+
+    return JsonResponse(stats.snapshot())
+
+
+def bulk_price(value):
+    try:
+        price = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError('must be a number')
+    if not price.is_finite() or price < 0 or price >= 10 ** 8 or price != price.quantize(Decimal('0.01')):
+        raise ValueError('must be between 0 and 99999999.99 with at most 2 decimals')
+    return price
+
+
+PRODUCT_FIELDS = {'name': bulk.text(100), 'price': bulk_price}
+USER_FIELDS = {'name': bulk.text(100), 'age': bulk.whole_number}
+
+
+def update_rows(model, updates):
+    # bulk_update() builds a CASE WHEN per field and row in Python, which is
+    # ~50x slower than one executemany UPDATE per set of updated fields.
+    groups = {}
+    for op in updates:
+        groups.setdefault(tuple(sorted(op.values)), []).append(op)
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        for names, ops in groups.items():
+            fields = [model._meta.get_field(name) for name in names]
+            assignments = ', '.join(f'{connection.ops.quote_name(field.column)} = %s' for field in fields)
+            cursor.executemany(
+                f'UPDATE {table} SET {assignments} WHERE id = %s',
+                [[field.get_db_prep_save(op.values[field.name], connection) for field in fields] + [op.id] for op in ops],
+            )
+
+
+def apply_bulk_chunk(model, chunk, report):
+    # One in_bulk query, then bulk_create, update_rows and one DELETE ... IN.
+    # Returns the prices of the created rows and the (old, new) prices of the
+    # updated ones, which the statistics need; delete() sends post_delete for
+    # every row, so deletes keep them up to date by themselves.
+    existing = model.objects.in_bulk([op.id for op in chunk if op.op != 'create'])
+    creates, updates, deletes = [], [], []
+    for op in chunk:
+        if op.op != 'create' and op.id not in existing:
+            report[op.index] = bulk.result(op.index, op.op, op.id, 'error', 'not found')
+        else:
+            {'create': creates, 'update': updates, 'delete': deletes}[op.op].append(op)
+    added, repriced = [], []
+    if creates:
+        for op, obj in zip(creates, model.objects.bulk_create([model(**op.values) for op in creates])):
+            op.id = obj.pk
+            added.append(op.values.get('price'))
+    if updates:
+        for op in updates:
+            if 'price' in op.values:
+                repriced.append((existing[op.id].price, op.values['price']))
+        update_rows(model, updates)
+    if deletes:
+        model.objects.filter(id__in=[op.id for op in deletes]).delete()
+    for op in creates + updates + deletes:
+        report[op.index] = bulk.result(op.index, op.op, op.id, bulk.DONE[op.op])
+    return added, repriced
+
+
+def apply_bulk(request, model, fields, ops):
+    # request.body is capped at DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB), less
+    # than a large price list, so the body is read with BULK_MAX_BYTES instead.
+    if int(request.META.get('CONTENT_LENGTH') or 0) > bulk.BULK_MAX_BYTES:
+        raise bulk.PayloadError(f'at most {bulk.BULK_MAX_BYTES} bytes per request')
+    rows = bulk.parse_payload(request.read(), request.content_type or '')
+    valid, report = bulk.validate(rows, fields, ops)
+    added, repriced = [], []
+    for chunk in bulk.chunks(valid):
+        try:
+            with transaction.atomic():
+                chunk_added, chunk_repriced = apply_bulk_chunk(model, chunk, report)
+        except DatabaseError:
+            # A constraint broke the chunk: retry its rows one transaction
+            # each so that only the offending rows fail.
+            chunk_added, chunk_repriced = [], []
+            for op in chunk:
+                try:
+                    with transaction.atomic():
+                        row_added, row_repriced = apply_bulk_chunk(model, [op], report)
+                except DatabaseError as e:
+                    report[op.index] = bulk.result(op.index, op.op, None if op.op == 'create' else op.id, 'error', str(e))
+                    continue
+                chunk_added += row_added
+                chunk_repriced += row_repriced
+        added += chunk_added
+        repriced += chunk_repriced
+    changed = any(entry['status'] != 'error' for entry in report)
+    return report, changed, added, repriced
+
+
+def bulk_products(request):
+    auth_token = request.COOKIES.get('auth_token')
+    user = get_user_by_token(auth_token)
+
+    if not user or user.role != 'admin':
+        return redirect('login')
+
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        report, changed, added, repriced = apply_bulk(request, Product, PRODUCT_FIELDS, ('create', 'update', 'delete'))
+    except bulk.PayloadError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+    if added or repriced:
+        stats.products_bulk_changed(added, repriced)
+    if changed:
+        catalog.bump('product')
+    return JsonResponse(bulk.summary(report))
+
+
+def bulk_users(request):
+    auth_token = request.COOKIES.get('auth_token')
+    user = get_user_by_token(auth_token)
+
+    if not user or user.role != 'admin':
+        return redirect('login')
+
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        report, changed, added, repriced = apply_bulk(request, User, USER_FIELDS, ('update', 'delete'))
+    except bulk.PayloadError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+    if changed:
+        catalog.bump('user')
+    return JsonResponse(bulk.summary(report))
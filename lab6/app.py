@@ -1,30 +1,93 @@
-from flask import Flask, render_template, redirect, url_for, request, session
+import os
+from flask import Flask, render_template, redirect, url_for, request, session, abort
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, IntegerField, SubmitField
 from wtforms.validators import DataRequired
 from flask_migrate import Migrate
+from metrics import INSTRUMENTATION_ENABLED, init_flask
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'mysecretkey'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///site.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
+if INSTRUMENTATION_ENABLED:
+    init_flask(app)
+
+POSTS_PER_PAGE = 20
+USERS_PER_PAGE = 20
+# Posts shown under each user on the index page; the rest are on /posts.
+INDEX_POSTS_PER_USER = 5
+
+tags_posts = db.Table('tags_posts',
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    db.Column('post_id', db.Integer, db.ForeignKey('post.id'), primary_key=True)
+)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer, nullable=False)
 
     posts = db.relationship('Post', backref='user', lazy=True, cascade='all, delete-orphan')
+    profile = db.relationship('Profile', backref='user', uselist=False, cascade='all, delete-orphan')
 
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+
+    tags = db.relationship('Tag', secondary=tags_posts, backref='posts', lazy=True)
+
+class Profile(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    bio = db.Column(db.Text)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+
+
+# Query layer. Every page is loaded with a fixed number of statements: the
+# relationships the templates walk are fetched with one extra SELECT ... IN
+# per relationship instead of one lazy load per row.
+
+def users_page(page, per_page=USERS_PER_PAGE):
+    return db.paginate(select(User).order_by(User.id), page=page, per_page=per_page, error_out=False)
+
+
+def first_posts(user_ids, limit=INDEX_POSTS_PER_USER):
+    # {user_id: posts} with the first limit + 1 posts of every user, in one
+    # query; the extra post tells the index page to link to the rest. Only
+    # the columns index.html shows are loaded.
+    number = func.row_number().over(partition_by=Post.user_id, order_by=Post.id).label('number')
+    ranked = select(Post.id, Post.title, Post.content, Post.user_id, number).where(Post.user_id.in_(user_ids)).subquery()
+    rows = db.session.execute(select(ranked).where(ranked.c.number <= limit + 1).order_by(ranked.c.user_id, ranked.c.number))
+    posts = {user_id: [] for user_id in user_ids}
+    for row in rows:
+        posts[row.user_id].append(row)
+    return posts
+
+
+def user_with_profile_or_404(user_id):
+    query = select(User).options(joinedload(User.profile)).where(User.id == user_id)
+    user = db.session.scalars(query).first()
+    if user is None:
+        abort(404)
+    return user
+
+
+def posts_page(user_id, page, per_page=POSTS_PER_PAGE):
+    query = select(Post).options(selectinload(Post.tags)).where(Post.user_id == user_id).order_by(Post.id)
+    return db.paginate(query, page=page, per_page=per_page, error_out=False)
 
 class UserForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired()])
@@ -40,8 +103,9 @@ class PostForm(FlaskForm):
 
 @app.route('/')
 def index():
-    users = User.query.all()
-    return render_template('index.html', users=users)
+    users = users_page(request.args.get('page', 1, type=int))
+    posts = first_posts([user.id for user in users.items])
+    return render_template('index.html', users=users, posts=posts, posts_per_user=INDEX_POSTS_PER_USER)
 
 
 @app.route('/add', methods=['GET', 'POST'])
@@ -65,8 +129,9 @@ def delete_user(id):
 
 @app.route('/posts/<int:user_id>')
 def posts(user_id):
-    user = User.query.get_or_404(user_id)
-    return render_template('posts.html', user=user)
+    user = user_with_profile_or_404(user_id)
+    page = posts_page(user.id, request.args.get('page', 1, type=int))
+    return render_template('posts.html', user=user, posts=page)
 
 
 @app.route('/add_post/<int:user_id>', methods=['GET', 'POST'])
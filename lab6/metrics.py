@@ -0,0 +1,176 @@
+import contextvars
+import os
+import threading
+import time
+
+from flask import Response, before_render_template, g, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request instrumentation: latency per route, the number and time of database
+# statements and the template render time of every request. Everything is off
+# unless METRICS=1 (collect and serve /metrics in the Prometheus text format)
+# or SERVER_TIMING=1 (send a Server-Timing header) is set; when both are off
+# the apps do not install any hook, so there is nothing to pay per request.
+# Counters live in the worker process, so with several workers each scrape
+# sees the worker that answered it.
+METRICS_ENABLED = os.getenv("METRICS", "0") == "1"
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "0") == "1"
+INSTRUMENTATION_ENABLED = METRICS_ENABLED or SERVER_TIMING_ENABLED
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        return (
+            f'app;dur={self.elapsed() * 1000:.1f}, '
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_count} queries", '
+            f'tpl;dur={self.template_seconds * 1000:.1f}'
+        )
+
+
+# The timings of the request being handled. Hooks that run outside a request
+# (startup, CLI commands) see None and record nothing.
+current = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_db(seconds):
+    timings = current.get()
+    if timings is not None:
+        timings.db_count += 1
+        timings.db_seconds += seconds
+
+
+def record_template(seconds):
+    timings = current.get()
+    if timings is not None:
+        timings.template_seconds += seconds
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def labels(**values):
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in values.items()) + "}"
+
+
+class Registry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.requests = {}
+        self.latency = {}
+        self.db_statements = {}
+        self.db_seconds = {}
+        self.template_seconds = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, timings):
+        seconds = timings.elapsed()
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            counts = self.latency.setdefault((route, method), [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += seconds
+            self.db_statements[route] = self.db_statements.get(route, 0) + timings.db_count
+            self.db_seconds[route] = self.db_seconds.get(route, 0.0) + timings.db_seconds
+            self.template_seconds[route] = self.template_seconds.get(route, 0.0) + timings.template_seconds
+
+    def render(self):
+        with self._lock:
+            lines = [
+                "# HELP http_requests_total Requests handled, by route, method and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{labels(route=route, method=method, status=status)} {count}")
+            lines += [
+                "# HELP http_request_duration_seconds Request latency.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (route, method), counts in sorted(self.latency.items()):
+                for bound, count in zip([*self.buckets, "+Inf"], counts[:-1]):
+                    lines.append(f"http_request_duration_seconds_bucket{labels(route=route, method=method, le=bound)} {count}")
+                lines.append(f"http_request_duration_seconds_sum{labels(route=route, method=method)} {counts[-1]}")
+                lines.append(f"http_request_duration_seconds_count{labels(route=route, method=method)} {counts[-2]}")
+            for name, help_text, values in (
+                ("db_statements_total", "Database statements executed.", self.db_statements),
+                ("db_duration_seconds_total", "Time spent executing database statements.", self.db_seconds),
+                ("template_render_seconds_total", "Time spent rendering templates.", self.template_seconds),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for route, value in sorted(values.items()):
+                    lines.append(f"{name}{labels(route=route)} {value}")
+            return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def instrument_sqlalchemy(target):
+    # target is an Engine, or the Engine class itself to cover every engine
+    # the process creates (Flask-SQLAlchemy creates its engines lazily).
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_started = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        record_db(time.perf_counter() - context.metrics_started)
+
+    event.listen(target, "before_cursor_execute", before)
+    event.listen(target, "after_cursor_execute", after)
+
+
+def init_flask(app):
+    instrument_sqlalchemy(Engine)
+
+    @app.before_request
+    def start_timings():
+        g.metrics_token = current.set(RequestTimings())
+
+    @app.after_request
+    def finish_timings(response):
+        timings = current.get()
+        if timings is None:
+            return response
+        if SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = timings.server_timing()
+        if METRICS_ENABLED:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            registry.observe(route, request.method, response.status_code, timings)
+        return response
+
+    @app.teardown_request
+    def reset_timings(exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            current.reset(token)
+
+    def template_started(sender, template, context, **extra):
+        g.metrics_template_started = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        started = g.pop("metrics_template_started", None)
+        if started is not None:
+            record_template(time.perf_counter() - started)
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    if METRICS_ENABLED:
+        app.add_url_rule(METRICS_PATH, "metrics", lambda: Response(registry.render(), content_type=CONTENT_TYPE))
@@ -0,0 +1,26 @@
+"""Index post.user_id
+
+Revision ID: 3f2a9c1d7b64
+Revises: e676d7d84472
+Create Date: 2026-10-18 21:05:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b64'
+down_revision = 'e676d7d84472'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The posts pages and the index page's first posts select by user_id.
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_post_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_post_user_id'))
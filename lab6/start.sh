@@ -0,0 +1,6 @@
+#!/bin/sh
+# SERVER_MODE=development runs the development server instead.
+if [ "$SERVER_MODE" = "development" ]; then
+    exec flask run --host=0.0.0.0
+fi
+exec gunicorn -c gunicorn.conf.py app:app
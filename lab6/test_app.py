@@ -0,0 +1,75 @@
+import os
+import unittest
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from sqlalchemy import event
+
+from app import INDEX_POSTS_PER_USER, POSTS_PER_PAGE, USERS_PER_PAGE, Post, Profile, Tag, User, app, db
+
+
+class QueryCountTest(unittest.TestCase):
+    # Every page must issue the same number of statements whatever the
+    # number of users, posts and tags.
+
+    def setUp(self):
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def seed(self, users, posts_per_user, tags_per_post):
+        tags = [Tag(name=f'tag-{i}') for i in range(tags_per_post)]
+        for i in range(users):
+            user = User(name=f'user-{i}', age=20 + i % 50, profile=Profile(bio=f'bio {i}'))
+            user.posts = [Post(title=f'Post {j}', content='Lorem ipsum', tags=tags) for j in range(posts_per_user)]
+            db.session.add(user)
+        db.session.commit()
+        db.session.expunge_all()
+
+    def statements(self, path):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            response = self.client.get(path)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_index_statements_do_not_grow(self):
+        self.seed(users=2, posts_per_user=1, tags_per_post=1)
+        small = self.statements('/')
+        self.seed(users=USERS_PER_PAGE * 3, posts_per_user=INDEX_POSTS_PER_USER * 4, tags_per_post=5)
+        self.assertEqual(self.statements('/'), small)
+        self.assertEqual(self.statements('/?page=2'), small)
+
+    def test_posts_statements_do_not_grow(self):
+        self.seed(users=1, posts_per_user=1, tags_per_post=1)
+        small = self.statements('/posts/1')
+        self.seed(users=1, posts_per_user=POSTS_PER_PAGE * 3, tags_per_post=5)
+        self.assertEqual(self.statements('/posts/2'), small)
+        self.assertEqual(self.statements('/posts/2?page=3'), small)
+
+    def test_index_is_paginated(self):
+        self.seed(users=USERS_PER_PAGE + 1, posts_per_user=INDEX_POSTS_PER_USER + 1, tags_per_post=0)
+        first = self.client.get('/').get_data(as_text=True)
+        self.assertEqual(first.count('years old'), USERS_PER_PAGE)
+        self.assertEqual(first.count('Delete Post'), USERS_PER_PAGE * INDEX_POSTS_PER_USER)
+        self.assertIn('All posts', first)
+        second = self.client.get('/?page=2').get_data(as_text=True)
+        self.assertEqual(second.count('years old'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()